@@ -1,487 +1,596 @@
-# -*- coding: utf-8 -*-
-import math, re, subprocess
-from collections import Counter
-
-import numpy as np
-import pandas as pd
-from sentence_transformers import SentenceTransformer, util
-import tkinter as tk
-from tkinter import simpledialog, filedialog
-
-# --------- Package check & install ----------
-required_packages = ["pandas", "openpyxl", "sentence-transformers", "torch", "numpy"]
-for package in required_packages:
-    try:
-        __import__(package.split("-")[0])
-    except ImportError:
-        print(f"Installing {package} ...")
-        subprocess.run(["pip", "install", package], check=False)
-
-print("All required packages are installed.")
-
-# --------- Load SBERT model ----------
-model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
-
-# --------- Initialize tkinter ----------
-root = tk.Tk()
-root.withdraw()
-root.attributes("-topmost", True)
-
-# --------- User inputs via dialogs ----------
-max_duration_days = simpledialog.askinteger(
-    "Max Duration (days)", "Enter the maximum allowed duration (days):",
-    minvalue=1, initialvalue=25
-)
-if max_duration_days is None: raise SystemExit
-
-similarity_threshold = simpledialog.askfloat(
-    "Similarity Threshold", "Enter similarity threshold (0.0 - 1.0), e.g., 0.40:",
-    minvalue=0.0, maxvalue=1.0, initialvalue=0.40
-)
-if similarity_threshold is None: raise SystemExit
-
-default_crews = simpledialog.askinteger(
-    "Number of Crews", "How many crews?", minvalue=1, initialvalue=1
-)
-if default_crews is None: raise SystemExit
-
-baseline_area = simpledialog.askfloat(
-    "Baseline Qty (default m²)",
-    "Enter baseline quantity for reference-duration scaling (e.g., 1500):",
-    minvalue=1.0, initialvalue=1500.0
-)
-if baseline_area is None: raise SystemExit
-
-# ---- Steel intensity defaults (editable in dialog) ----
-steel_col_kgm3 = simpledialog.askfloat(
-    "Steel Intensity - Columns", "Default steel intensity for Columns (kg/m³):",
-    minvalue=1.0, initialvalue=120.0
-)
-steel_slab_kgm3 = simpledialog.askfloat(
-    "Steel Intensity - Slabs", "Default steel intensity for Slabs (kg/m³):",
-    minvalue=1.0, initialvalue=100.0
-)
-steel_found_kgm3 = simpledialog.askfloat(
-    "Steel Intensity - Foundations", "Default steel intensity for Foundations (kg/m³):",
-    minvalue=1.0, initialvalue=90.0
-)
-
-print(f"Max duration: {max_duration_days} days")
-print(f"Threshold: {similarity_threshold}")
-print(f"Crews: {default_crews}")
-print(f"Baseline Qty: {baseline_area}")
-print(f"Steel factors (kg/m³): Columns={steel_col_kgm3}, Slabs={steel_slab_kgm3}, Foundations={steel_found_kgm3}")
-
-# --------- File selection ----------
-print("Please select the Activity List file...")
-activity_list_file = filedialog.askopenfilename(
-    title="Select Activity List file", filetypes=[("Excel files", "*.xlsx")]
-)
-if not activity_list_file: raise SystemExit
-
-print("Please select the Dictionary file...")
-dictionary_file = filedialog.askopenfilename(
-    title="Select Dictionary file", filetypes=[("Excel files", "*.xlsx")]
-)
-if not dictionary_file: raise SystemExit
-
-# --------- Load data ----------
-activity_list_df = pd.read_excel(activity_list_file)
-dictionary_df = pd.read_excel(dictionary_file, sheet_name="Duration")
-
-# normalize headers
-activity_list_df.columns = [str(c).strip().lower() for c in activity_list_df.columns]
-dictionary_df.columns = [str(c).strip().lower() for c in dictionary_df.columns]
-
-# activity columns
-col_activity_name = "activity name"
-col_type   = "type"
-col_element = "element"
-col_area   = "area"
-col_volume = "volume"     # optional
-col_weight = "weight"     # optional actual weight (kg) if available
-
-# dictionary columns
-dict_activity_name = "activity name"
-dict_prod_rate     = "production rate"
-dict_ref_duration  = "reference duration"
-# detect unit column (e.g., "Unit /day")
-dict_unit_raw = None
-for cand in ["unit /day","unit/day","unit","production unit","rate unit","uom","unit of measure"]:
-    if cand in dictionary_df.columns:
-        dict_unit_raw = cand
-        break
-if dict_unit_raw is None:
-    raise ValueError("Dictionary must include a unit column (e.g., 'Unit /day').")
-
-# --------- Ensure numeric ----------
-if col_area in activity_list_df.columns:
-    activity_list_df[col_area] = pd.to_numeric(activity_list_df[col_area], errors="coerce").fillna(0)
-else:
-    activity_list_df[col_area] = 0
-
-if col_volume in activity_list_df.columns:
-    activity_list_df[col_volume] = pd.to_numeric(activity_list_df[col_volume], errors="coerce").fillna(0)
-else:
-    activity_list_df[col_volume] = 0
-
-if col_weight in activity_list_df.columns:
-    activity_list_df[col_weight] = pd.to_numeric(activity_list_df[col_weight], errors="coerce").fillna(0)
-else:
-    activity_list_df[col_weight] = 0
-
-# ---- Clean production rate: handle '250 m2/day' or '250,0' etc. ----
-prod_raw = dictionary_df[dict_prod_rate].astype(str).str.replace(",", ".", regex=False)
-dictionary_df[dict_prod_rate] = pd.to_numeric(
-    prod_raw.str.extract(r"([\d.]+)")[0],
-    errors="coerce"
-)
-dictionary_df[dict_ref_duration] = pd.to_numeric(dictionary_df[dict_ref_duration], errors="coerce")
-
-activity_list_df["number of crews"] = default_crews
-
-# =========================
-# SMART MATCH HELPERS (NEW)
-# =========================
-ACTION_SYNS = {
-    "shuttering": {"shuttering", "formwork", "shutter", "form"},
-    "steelfixing": {"steelfixing", "rebar", "steel fixing", "reinforcement"},
-    "pouring": {"pouring", "cast", "casting", "concreting"},
-    "deshuttering": {"deshuttering", "striking", "deform", "de-shuttering", "strip"},
-}
-
-TYPE_ANCHORS = {
-    "slab": {"slab", "slabs", "rc slab"},
-    "columns": {"column", "columns", "rc column"},
-    "foundation": {"foundation", "foundations", "raft", "footing", "pile cap", "pc", "p.c"},
-}
-
-ELEMENT_GROUP_PATTERNS = [
-    ("sog", r"\bslab(?:\s+)?on(?:\s+)?grade\b|\bsog\b"),
-    ("floor", r"\b(first|second|third|forth|fourth|fifth|sixth)\s+floor\b|\bfloor\b"),
-    ("pc", r"\b(p\.?c)\b|\bprecast\b"),
-    ("foundation", r"\bfoundation\b|\bfooting\b|\bpile\s*cap\b|\braft\b"),
-]
-
-STOPWORDS = {"rc","concrete","of","on","the"}
-
-def normalize_text(s: str) -> str:
-    s = (s or "").lower()
-    s = re.sub(r"[-_/]", " ", s)
-    s = re.sub(r"\d+(\.\d+)?", "", s)   # remove numbers like 103.30, 106.00
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
-
-def detect_action(s: str):
-    s = normalize_text(s)
-    best, score = None, 0
-    for act, syns in ACTION_SYNS.items():
-        hits = [x for x in syns if x in s]
-        if hits:
-            local = max(len(x) for x in hits)
-            if local > score:
-                score, best = local, act
-    return best
-
-def detect_type_anchor(s: str):
-    s = normalize_text(s)
-    for t, keys in TYPE_ANCHORS.items():
-        if any(k in s for k in keys):
-            return t
-    if "column" in s: return "columns"
-    if "slab" in s: return "slab"
-    if any(k in s for k in ["foundation","footing","pile cap","raft"]): return "foundation"
-    return None
-
-def detect_element_group(s: str):
-    s = normalize_text(s)
-    for name, pat in ELEMENT_GROUP_PATTERNS:
-        if re.search(pat, s):
-            return name
-    if "floor" in s: return "floor"
-    if "slab on grade" in s or "sog" in s: return "sog"
-    return None
-
-def token_overlap(a: str, b: str) -> float:
-    toksA = [t for t in re.findall(r"[a-z]+", normalize_text(a)) if t not in STOPWORDS]
-    toksB = [t for t in re.findall(r"[a-z]+", normalize_text(b)) if t not in STOPWORDS]
-    if not toksA or not toksB: return 0.0
-    ca, cb = Counter(toksA), Counter(toksB)
-    inter = sum((ca & cb).values())
-    uni   = sum((ca | cb).values())
-    return inter/uni if uni else 0.0
-
-def feature_match_score(query_txt: str, cand_txt: str, emb_sim: float):
-    q_action  = detect_action(query_txt)
-    c_action  = detect_action(cand_txt)
-    q_type    = detect_type_anchor(query_txt)
-    c_type    = detect_type_anchor(cand_txt)
-    q_elem    = detect_element_group(query_txt)
-    c_elem    = detect_element_group(cand_txt)
-
-    flags = {
-        "action_eq": q_action and c_action and (q_action == c_action),
-        "type_eq":   q_type and c_type and (q_type == c_type),
-        "elem_eq":   q_elem and c_elem and (q_elem == c_elem),
-        "q_action": q_action, "c_action": c_action,
-        "q_type": q_type, "c_type": c_type,
-        "q_elem": q_elem, "c_elem": c_elem,
-    }
-
-    # HARD FILTERS
-    if q_action and c_action and q_action != c_action:
-        return -1.0, flags, "reject: action mismatch"
-    if q_elem and c_elem and q_elem != c_elem:
-        return -1.0, flags, "reject: element mismatch"
-    if q_type and c_type and q_type != c_type:
-        return -1.0, flags, "reject: type mismatch"
-
-    overlap = token_overlap(query_txt, cand_txt)
-    bonus = 0.0
-    if flags["action_eq"]: bonus += 0.06
-    if flags["elem_eq"]:   bonus += 0.06
-    if flags["type_eq"]:   bonus += 0.04
-
-    final = 0.7*emb_sim + 0.2*overlap + 0.1*bonus
-    return final, flags, f"emb={emb_sim:.3f}, ovl={overlap:.3f}, bonus={bonus:.2f}"
-
-# --------- Units: robust extractor (PATCHED) ----------
-def norm_uom(u: str) -> str:
-    """Robust unit extractor from messy strings like 'Area @ m2/day'."""
-    if pd.isna(u):
-        return ""
-    s = str(u).lower().strip()
-
-    # normalize visuals/aliases
-    s = (s.replace("²", "2").replace("³", "3")
-           .replace("sqm", "m2").replace("m^2", "m2").replace("m^3", "m3"))
-
-    # detect anywhere in the string
-    if "m3" in s: return "m3"
-    if "m2" in s: return "m2"
-    if "kg" in s: return "kg"
-    if "ton" in s or re.search(r"\b(t|tonne)\b", s): return "ton"
-    if re.search(r"\bpcs?\b|\bno\b|\bnr\b", s): return "pcs"
-    if re.search(r"\blm\b|\bm\b", s): return "m"
-
-    # fallback: left of '/'
-    if "/" in s:
-        left = s.split("/", 1)[0]
-        if "m3" in left: return "m3"
-        if "m2" in left: return "m2"
-        if "kg" in left: return "kg"
-        if "ton" in left or left.strip() == "t": return "ton"
-
-    return ""
-
-def steel_factor_for_activity(activity_text: str) -> float:
-    t = (activity_text or "").lower()
-    if "column" in t: return steel_col_kgm3
-    if "slab" in t: return steel_slab_kgm3
-    if "foundation" in t or "footing" in t or "raft" in t: return steel_found_kgm3
-    return steel_slab_kgm3
-
-def choose_quantity_strict_by_unit(row, unit_value, activity_text):
-    """
-    m3 -> Volume
-    m2 -> Area
-    kg/ton -> Weight; if not present, estimate from Volume × steel_factor(activity) (kg/m3)
-    """
-    u = norm_uom(unit_value)
-    a = float(row.get(col_area, 0) or 0)
-    v = float(row.get(col_volume, 0) or 0)
-    w = float(row.get(col_weight, 0) or 0)
-
-    if u == "m3":
-        return (v if v > 0 else 0.0), "Area @ m3/day (Volume)"
-    if u == "m2":
-        return (a if a > 0 else 0.0), "Area @ m2/day"
-    if u in {"kg","ton"}:
-        if w > 0:
-            if u == "kg":  return w, "Weight(kg) @ kg/day"
-            else:          return w/1000.0, "Weight(ton from kg) @ ton/day"
-        if v > 0:
-            factor = steel_factor_for_activity(activity_text)  # kg/m3
-            est_kg = v * factor
-            if u == "kg":  return est_kg, f"Weight(est: {factor} kg/m3 × Volume) @ kg/day"
-            else:          return est_kg/1000.0, f"Weight(est: {factor} kg/m3 × Volume) @ ton/day"
-        return 0.0, "Weight missing"
-    return 0.0, "None"
-
-# --------- Prepare embeddings ----------
-activity_names = activity_list_df[col_activity_name].astype(str).str.lower().tolist()
-dict_names = dictionary_df[dict_activity_name].astype(str).str.lower().tolist()
-
-print("Computing embeddings...")
-activity_emb = model.encode(activity_names, convert_to_tensor=True, normalize_embeddings=True)
-dict_emb = model.encode(dict_names, convert_to_tensor=True, normalize_embeddings=True)
-
-# --------- Matching & calculation loop ----------
-matched_names, matched_scores = [], []
-durations, basis_list = [], []
-suggested_crews_list, suggested_durations = [], []
-origin_pre_cap_list = []
-estimated_weight_kg_list = []  # for final output after Volume
-match_flags_list, match_reason_list = [], []
-embedding_sim_list = []
-parsed_unit_list, qty_used_list = [], []  # DEBUG (PATCHED)
-
-for idx, act in enumerate(activity_names):
-    # Build query text with (type/element) if available
-    row = activity_list_df.iloc[idx]
-    qtxt = f"{row.get(col_activity_name,'')} {row.get(col_type,'')} {row.get(col_element,'')}"
-    qtxt_norm = normalize_text(qtxt)
-
-    sims_t = util.pytorch_cos_sim(activity_emb[idx], dict_emb)[0]  # tensor of sims
-    sims = sims_t.cpu().numpy().ravel()
-
-    # Rank candidates with smart score
-    scored = []
-    for i, cand in enumerate(dict_names):
-        final, flags, reason = feature_match_score(qtxt_norm, cand, float(sims[i]))
-        if final >= 0:
-            scored.append((final, i, flags, reason))
-
-    # Fallback if all rejected
-    if not scored:
-        best_idx = int(np.argmax(sims))
-        final_score = float(sims[best_idx])
-        best_reason = "no candidate passed hard filters; used highest emb_sim"
-        best_flags = {"fallback": True}
-    else:
-        scored.sort(reverse=True, key=lambda x: x[0])
-        final_score, best_idx, best_flags, best_reason = scored[0]
-
-    embedding_sim_list.append(round(float(sims[best_idx]), 3))
-    match_flags_list.append(str(best_flags))
-    match_reason_list.append(best_reason)
-
-    # Pull dict values
-    matched_name = dictionary_df.iloc[best_idx][dict_activity_name]
-    prod_rate    = dictionary_df.iloc[best_idx][dict_prod_rate]
-    ref_dur      = dictionary_df.iloc[best_idx][dict_ref_duration]
-    unit_val     = dictionary_df.iloc[best_idx][dict_unit_raw]  # e.g., "Area @ m2/day"
-
-    crews = activity_list_df.iloc[idx]["number of crews"]
-
-    # Quantity by unit (with steel estimation if needed)
-    qty, qty_basis = choose_quantity_strict_by_unit(
-        activity_list_df.iloc[idx], unit_val, activity_list_df.iloc[idx][col_activity_name]
-    )
-    parsed_unit_list.append(norm_uom(unit_val))
-    qty_used_list.append(qty)
-
-    # compute Estimated Weight (kg) for output column
-    u_norm = norm_uom(unit_val)
-    vol_i = float(activity_list_df.iloc[idx].get(col_volume, 0) or 0)
-    w_i = float(activity_list_df.iloc[idx].get(col_weight, 0) or 0)
-    if w_i > 0:
-        est_weight_kg = w_i
-    elif u_norm in {"kg","ton"} and vol_i > 0:
-        est_weight_kg = vol_i * steel_factor_for_activity(activity_list_df.iloc[idx][col_activity_name])
-    else:
-        est_weight_kg = 0.0
-    estimated_weight_kg_list.append(round(est_weight_kg, 4))
-
-    duration, basis = None, "Manual Review"
-    suggested_crews, suggested_dur = "N/A", "N/A"
-    pre_cap_dur = None
-
-    # استخدمنا threshold على final_score (الأذكى)
-    if final_score >= similarity_threshold:
-        if pd.notna(prod_rate) and prod_rate > 0 and qty > 0:
-            raw = qty / (prod_rate * max(crews, 1))
-            pre_cap_dur = max(1, math.ceil(raw))
-            duration = min(pre_cap_dur, max_duration_days)
-            basis = f"{qty_basis}"
-        elif pd.notna(ref_dur) and ref_dur > 0:
-            if qty > 0:
-                scaled = ref_dur * (qty / max(baseline_area, 1e-6))
-                raw = scaled / max(crews, 1)
-                pre_cap_dur = max(1, math.ceil(raw))
-                duration = min(pre_cap_dur, max_duration_days)
-                basis = f"Reference-Scaled ({qty_basis})"
-            else:
-                pre_cap_dur = int(ref_dur)
-                duration = min(pre_cap_dur, max_duration_days)
-                basis = "Reference"
-        else:
-            duration = "Manual Review"
-
-        # Suggested crews if capped
-        if isinstance(duration, (int, float)) and pre_cap_dur and pre_cap_dur > max_duration_days:
-            if qty > 0 and prod_rate and prod_rate > 0:
-                crews_needed = math.ceil(qty / (prod_rate * max_duration_days))
-                suggested_crews = crews_needed
-                sug_raw = qty / (prod_rate * crews_needed)
-                suggested_dur = max(1, math.ceil(sug_raw))
-            elif qty > 0 and ref_dur and ref_dur > 0:
-                crews_needed = math.ceil((ref_dur * (qty / max(baseline_area, 1e-6))) / max_duration_days)
-                suggested_crews = crews_needed
-                sug_raw = (ref_dur * (qty / max(baseline_area, 1e-6))) / max(crews_needed, 1)
-                suggested_dur = max(1, math.ceil(sug_raw))
-    else:
-        duration = "Manual Review"
-
-    matched_names.append(matched_name if final_score >= similarity_threshold else "No Match")
-    matched_scores.append(round(final_score, 3))
-    durations.append(duration)
-    basis_list.append(basis)
-    suggested_crews_list.append(suggested_crews)
-    suggested_durations.append(suggested_dur)
-    origin_pre_cap_list.append(pre_cap_dur if pre_cap_dur is not None else "N/A")
-
-# --------- Add results ----------
-activity_list_df["matched activity"] = matched_names
-activity_list_df["similarity score"] = matched_scores              # final (smart) score
-activity_list_df["embedding similarity"] = embedding_sim_list      # raw cosine for مراجعة
-activity_list_df["match_flags"] = match_flags_list
-activity_list_df["match_reason"] = match_reason_list
-activity_list_df["unit (parsed)"] = parsed_unit_list               # (PATCHED) تشخيص
-activity_list_df["qty (used)"] = qty_used_list                     # (PATCHED) تشخيص
-activity_list_df["basis"] = basis_list
-activity_list_df["origin duration (pre-cap)"] = origin_pre_cap_list
-activity_list_df["duration (days)"] = durations
-activity_list_df["suggested crews (to meet max)"] = suggested_crews_list
-activity_list_df["suggested duration (days)"] = suggested_durations
-activity_list_df["activity duration (final)"] = activity_list_df["duration (days)"]
-
-# --- Insert 'Estimated Weight (kg)' after 'Volume'
-insert_after = col_volume
-new_col_name = "Estimated Weight (kg)"
-estimated_weight_series = pd.to_numeric(pd.Series(estimated_weight_kg_list), errors="coerce").fillna(0).round(4)
-
-if insert_after in activity_list_df.columns:
-    cols = activity_list_df.columns.tolist()
-    if new_col_name in cols:
-        cols.remove(new_col_name)
-        if new_col_name in activity_list_df.columns:
-            activity_list_df.drop(columns=[new_col_name], inplace=True)
-    activity_list_df[new_col_name] = estimated_weight_series
-    cols = activity_list_df.columns.tolist()
-    cols.remove(new_col_name)
-    insert_pos = cols.index(insert_after) + 1
-    cols = cols[:insert_pos] + [new_col_name] + cols[insert_pos:]
-    activity_list_df = activity_list_df[cols]
-else:
-    activity_list_df[new_col_name] = estimated_weight_series
-
-# keep tail order for duration-related columns
-desired_tail = ["origin duration (pre-cap)", "duration (days)", "suggested crews (to meet max)",
-                "suggested duration (days)", "activity duration (final)"]
-cols_tail_first = [c for c in activity_list_df.columns if c not in desired_tail] + desired_tail
-activity_list_df = activity_list_df[cols_tail_first]
-
-# --------- Save output ----------
-print("Select location to save output...")
-output_filename = filedialog.asksaveasfilename(
-    title="Save Output File",
-    defaultextension=".xlsx",
-    filetypes=[("Excel files", "*.xlsx")],
-    initialfile="Updated_Activity_List.xlsx"
-)
-if output_filename:
-    activity_list_df.to_excel(output_filename, index=False)
-    print(f"Results saved in: {output_filename}")
-else:
-    print("Save cancelled.")
+# -*- coding: utf-8 -*-
+import re, subprocess
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sentence_transformers import SentenceTransformer, util
+from Embedding_Cache import encode_cached, encode_unique, unique_inverse
+import tkinter as tk
+from tkinter import simpledialog, filedialog
+
+# --------- Package check & install ----------
+required_packages = ["pandas", "openpyxl", "sentence-transformers", "torch", "numpy", "scipy"]
+for package in required_packages:
+    try:
+        __import__(package.split("-")[0])
+    except ImportError:
+        print(f"Installing {package} ...")
+        subprocess.run(["pip", "install", package], check=False)
+
+print("All required packages are installed.")
+
+# --------- Load SBERT model ----------
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+model = SentenceTransformer(MODEL_NAME)
+
+# --------- Initialize tkinter ----------
+root = tk.Tk()
+root.withdraw()
+root.attributes("-topmost", True)
+
+# --------- User inputs via dialogs ----------
+max_duration_days = simpledialog.askinteger(
+    "Max Duration (days)", "Enter the maximum allowed duration (days):",
+    minvalue=1, initialvalue=25
+)
+if max_duration_days is None: raise SystemExit
+
+similarity_threshold = simpledialog.askfloat(
+    "Similarity Threshold", "Enter similarity threshold (0.0 - 1.0), e.g., 0.40:",
+    minvalue=0.0, maxvalue=1.0, initialvalue=0.40
+)
+if similarity_threshold is None: raise SystemExit
+
+default_crews = simpledialog.askinteger(
+    "Number of Crews", "How many crews?", minvalue=1, initialvalue=1
+)
+if default_crews is None: raise SystemExit
+
+baseline_area = simpledialog.askfloat(
+    "Baseline Qty (default m²)",
+    "Enter baseline quantity for reference-duration scaling (e.g., 1500):",
+    minvalue=1.0, initialvalue=1500.0
+)
+if baseline_area is None: raise SystemExit
+
+# ---- Steel intensity defaults (editable in dialog) ----
+steel_col_kgm3 = simpledialog.askfloat(
+    "Steel Intensity - Columns", "Default steel intensity for Columns (kg/m³):",
+    minvalue=1.0, initialvalue=120.0
+)
+steel_slab_kgm3 = simpledialog.askfloat(
+    "Steel Intensity - Slabs", "Default steel intensity for Slabs (kg/m³):",
+    minvalue=1.0, initialvalue=100.0
+)
+steel_found_kgm3 = simpledialog.askfloat(
+    "Steel Intensity - Foundations", "Default steel intensity for Foundations (kg/m³):",
+    minvalue=1.0, initialvalue=90.0
+)
+
+print(f"Max duration: {max_duration_days} days")
+print(f"Threshold: {similarity_threshold}")
+print(f"Crews: {default_crews}")
+print(f"Baseline Qty: {baseline_area}")
+print(f"Steel factors (kg/m³): Columns={steel_col_kgm3}, Slabs={steel_slab_kgm3}, Foundations={steel_found_kgm3}")
+
+# --------- File selection ----------
+print("Please select the Activity List file...")
+activity_list_file = filedialog.askopenfilename(
+    title="Select Activity List file", filetypes=[("Excel files", "*.xlsx")]
+)
+if not activity_list_file: raise SystemExit
+
+print("Please select the Dictionary file...")
+dictionary_file = filedialog.askopenfilename(
+    title="Select Dictionary file", filetypes=[("Excel files", "*.xlsx")]
+)
+if not dictionary_file: raise SystemExit
+
+# --------- Load data ----------
+activity_list_df = pd.read_excel(activity_list_file)
+dictionary_df = pd.read_excel(dictionary_file, sheet_name="Duration")
+
+# normalize headers
+activity_list_df.columns = [str(c).strip().lower() for c in activity_list_df.columns]
+dictionary_df.columns = [str(c).strip().lower() for c in dictionary_df.columns]
+
+# activity columns
+col_activity_name = "activity name"
+col_type   = "type"
+col_element = "element"
+col_area   = "area"
+col_volume = "volume"     # optional
+col_weight = "weight"     # optional actual weight (kg) if available
+
+# dictionary columns
+dict_activity_name = "activity name"
+dict_prod_rate     = "production rate"
+dict_ref_duration  = "reference duration"
+# detect unit column (e.g., "Unit /day")
+dict_unit_raw = None
+for cand in ["unit /day","unit/day","unit","production unit","rate unit","uom","unit of measure"]:
+    if cand in dictionary_df.columns:
+        dict_unit_raw = cand
+        break
+if dict_unit_raw is None:
+    raise ValueError("Dictionary must include a unit column (e.g., 'Unit /day').")
+
+# --------- Ensure numeric ----------
+if col_area in activity_list_df.columns:
+    activity_list_df[col_area] = pd.to_numeric(activity_list_df[col_area], errors="coerce").fillna(0)
+else:
+    activity_list_df[col_area] = 0
+
+if col_volume in activity_list_df.columns:
+    activity_list_df[col_volume] = pd.to_numeric(activity_list_df[col_volume], errors="coerce").fillna(0)
+else:
+    activity_list_df[col_volume] = 0
+
+if col_weight in activity_list_df.columns:
+    activity_list_df[col_weight] = pd.to_numeric(activity_list_df[col_weight], errors="coerce").fillna(0)
+else:
+    activity_list_df[col_weight] = 0
+
+# ---- Clean production rate: handle '250 m2/day' or '250,0' etc. ----
+prod_raw = dictionary_df[dict_prod_rate].astype(str).str.replace(",", ".", regex=False)
+dictionary_df[dict_prod_rate] = pd.to_numeric(
+    prod_raw.str.extract(r"([\d.]+)")[0],
+    errors="coerce"
+)
+dictionary_df[dict_ref_duration] = pd.to_numeric(dictionary_df[dict_ref_duration], errors="coerce")
+
+activity_list_df["number of crews"] = default_crews
+
+# =========================
+# SMART MATCH HELPERS (NEW)
+# =========================
+ACTION_SYNS = {
+    "shuttering": {"shuttering", "formwork", "shutter", "form"},
+    "steelfixing": {"steelfixing", "rebar", "steel fixing", "reinforcement"},
+    "pouring": {"pouring", "cast", "casting", "concreting"},
+    "deshuttering": {"deshuttering", "striking", "deform", "de-shuttering", "strip"},
+}
+
+TYPE_ANCHORS = {
+    "slab": {"slab", "slabs", "rc slab"},
+    "columns": {"column", "columns", "rc column"},
+    "foundation": {"foundation", "foundations", "raft", "footing", "pile cap", "pc", "p.c"},
+}
+
+ELEMENT_GROUP_PATTERNS = [
+    ("sog", r"\bslab(?:\s+)?on(?:\s+)?grade\b|\bsog\b"),
+    ("floor", r"\b(first|second|third|forth|fourth|fifth|sixth)\s+floor\b|\bfloor\b"),
+    ("pc", r"\b(p\.?c)\b|\bprecast\b"),
+    ("foundation", r"\bfoundation\b|\bfooting\b|\bpile\s*cap\b|\braft\b"),
+]
+
+STOPWORDS = {"rc","concrete","of","on","the"}
+
+def normalize_text(s: str) -> str:
+    s = (s or "").lower()
+    s = re.sub(r"[-_/]", " ", s)
+    s = re.sub(r"\d+(\.\d+)?", "", s)   # remove numbers like 103.30, 106.00
+    s = re.sub(r"\s+", " ", s).strip()
+    return s
+
+def detect_action(s: str):
+    s = normalize_text(s)
+    best, score = None, 0
+    for act, syns in ACTION_SYNS.items():
+        hits = [x for x in syns if x in s]
+        if hits:
+            local = max(len(x) for x in hits)
+            if local > score:
+                score, best = local, act
+    return best
+
+def detect_type_anchor(s: str):
+    s = normalize_text(s)
+    for t, keys in TYPE_ANCHORS.items():
+        if any(k in s for k in keys):
+            return t
+    if "column" in s: return "columns"
+    if "slab" in s: return "slab"
+    if any(k in s for k in ["foundation","footing","pile cap","raft"]): return "foundation"
+    return None
+
+def detect_element_group(s: str):
+    s = normalize_text(s)
+    for name, pat in ELEMENT_GROUP_PATTERNS:
+        if re.search(pat, s):
+            return name
+    if "floor" in s: return "floor"
+    if "slab on grade" in s or "sog" in s: return "sog"
+    return None
+
+def text_tokens(s: str):
+    return [t for t in re.findall(r"[a-z]+", normalize_text(s)) if t not in STOPWORDS]
+
+def counter_overlap(ca: Counter, cb: Counter) -> float:
+    if not ca or not cb: return 0.0
+    inter = sum((ca & cb).values())
+    uni   = sum((ca | cb).values())
+    return inter/uni if uni else 0.0
+
+def token_overlap(a: str, b: str) -> float:
+    return counter_overlap(Counter(text_tokens(a)), Counter(text_tokens(b)))
+
+def feature_match_score(query_txt: str, cand_txt: str, emb_sim: float):
+    q_action  = detect_action(query_txt)
+    c_action  = detect_action(cand_txt)
+    q_type    = detect_type_anchor(query_txt)
+    c_type    = detect_type_anchor(cand_txt)
+    q_elem    = detect_element_group(query_txt)
+    c_elem    = detect_element_group(cand_txt)
+
+    flags = {
+        "action_eq": q_action and c_action and (q_action == c_action),
+        "type_eq":   q_type and c_type and (q_type == c_type),
+        "elem_eq":   q_elem and c_elem and (q_elem == c_elem),
+        "q_action": q_action, "c_action": c_action,
+        "q_type": q_type, "c_type": c_type,
+        "q_elem": q_elem, "c_elem": c_elem,
+    }
+
+    # HARD FILTERS
+    if q_action and c_action and q_action != c_action:
+        return -1.0, flags, "reject: action mismatch"
+    if q_elem and c_elem and q_elem != c_elem:
+        return -1.0, flags, "reject: element mismatch"
+    if q_type and c_type and q_type != c_type:
+        return -1.0, flags, "reject: type mismatch"
+
+    overlap = token_overlap(query_txt, cand_txt)
+    bonus = 0.0
+    if flags["action_eq"]: bonus += 0.06
+    if flags["elem_eq"]:   bonus += 0.06
+    if flags["type_eq"]:   bonus += 0.04
+
+    final = 0.7*emb_sim + 0.2*overlap + 0.1*bonus
+    return final, flags, f"emb={emb_sim:.3f}, ovl={overlap:.3f}, bonus={bonus:.2f}"
+
+# --------- Feature table (detectors run once per text, not per pair) ----------
+ACTION_CODES = list(ACTION_SYNS)
+TYPE_CODES   = list(TYPE_ANCHORS)
+ELEM_CODES   = [name for name, _ in ELEMENT_GROUP_PATTERNS]
+
+def _code(value, codes):
+    return codes.index(value) if value is not None else -1
+
+def build_feature_table(texts):
+    """Action/type/element codes (-1 = not detected) and token bags for each text."""
+    norm = [normalize_text(t) for t in texts]
+    return {
+        "action": np.array([_code(detect_action(s), ACTION_CODES) for s in norm], dtype=int),
+        "type":   np.array([_code(detect_type_anchor(s), TYPE_CODES) for s in norm], dtype=int),
+        "elem":   np.array([_code(detect_element_group(s), ELEM_CODES) for s in norm], dtype=int),
+        "tokens": [Counter(text_tokens(s)) for s in norm],
+    }
+
+# --------- Token overlap as count-matrix algebra ----------
+OVERLAP_BLOCK = 2048   # query rows per overlap block
+
+def token_vocab(bags):
+    """Column index for every token in the bags."""
+    vocab = {}
+    for bag in bags:
+        for t in bag:
+            vocab.setdefault(t, len(vocab))
+    return vocab
+
+def count_matrix(bags, vocab):
+    """Sparse (len(bags) x len(vocab)) token counts (CSR); tokens outside vocab are dropped."""
+    rows, cols, vals = [], [], []
+    for i, bag in enumerate(bags):
+        for t, c in bag.items():
+            j = vocab.get(t)
+            if j is not None:
+                rows.append(i); cols.append(j); vals.append(c)
+    return sparse.csr_matrix((np.array(vals, dtype=np.int32), (rows, cols)), shape=(len(bags), len(vocab)))
+
+def at_least(counts, level):
+    """Sparse 0/1 indicator [count >= level] of a count matrix."""
+    ind = counts.copy()
+    ind.data = (ind.data >= level).astype(np.float32)
+    ind.eliminate_zeros()
+    return ind
+
+def overlap_matrix(q_bags, cand_feats):
+    """
+    counter_overlap (multiset |A & B| / |A or B|) of every query bag against every candidate.
+    sum(min) is built level by level from indicator products, min(a, b) = sum_l [a>=l][b>=l],
+    and sum(max) = |A| + |B| - sum(min). Query tokens missing from the dictionary
+    vocabulary can only add to |A|, so they are counted in the size and dropped from the matrix.
+    """
+    c_counts, c_sizes = cand_feats["counts"], cand_feats["sizes"]
+    q_counts = count_matrix(q_bags, cand_feats["vocab"])
+    q_sizes = np.array([sum(b.values()) for b in q_bags], dtype=np.float64)
+
+    inter = np.zeros((len(q_bags), len(c_sizes)))
+    for level in range(1, min(q_counts.data.max(initial=0), c_counts.data.max(initial=0)) + 1):
+        inter += (at_least(q_counts, level) @ at_least(c_counts, level).T).toarray()
+    uni = q_sizes[:, None] + c_sizes[None, :] - inter
+    ok = (q_sizes[:, None] > 0) & (c_sizes[None, :] > 0) & (uni > 0)
+    return np.where(ok, inter / np.where(ok, uni, 1.0), 0.0)
+
+def add_token_matrix(feats):
+    """Attach vocabulary, count matrix and bag sizes to a (dictionary) feature table."""
+    feats["vocab"] = token_vocab(feats["tokens"])
+    feats["counts"] = count_matrix(feats["tokens"], feats["vocab"])
+    feats["sizes"] = np.asarray(feats["counts"].sum(axis=1), dtype=np.float64).ravel()
+    return feats
+
+def smart_scores(q_feats, k, cand_feats, sims, overlap):
+    """
+    feature_match_score of query k against every candidate at once.
+    overlap is the query's row of overlap_matrix. Hard-filter rejects get -1.0,
+    like the scalar version.
+    """
+    qa, qt, qe = q_feats["action"][k], q_feats["type"][k], q_feats["elem"][k]
+    ca, ct, ce = cand_feats["action"], cand_feats["type"], cand_feats["elem"]
+
+    reject = (((qa >= 0) & (ca >= 0) & (ca != qa))
+              | ((qe >= 0) & (ce >= 0) & (ce != qe))
+              | ((qt >= 0) & (ct >= 0) & (ct != qt)))
+
+    bonus = np.zeros(len(ca))
+    bonus += 0.06 * ((qa >= 0) & (ca == qa))
+    bonus += 0.06 * ((qe >= 0) & (ce == qe))
+    bonus += 0.04 * ((qt >= 0) & (ct == qt))
+
+    final = 0.7*sims.astype(np.float64) + 0.2*overlap + 0.1*bonus
+    final[reject] = -1.0
+    return final
+
+# --------- Units: robust extractor (PATCHED) ----------
+def norm_uom(u: str) -> str:
+    """Robust unit extractor from messy strings like 'Area @ m2/day'."""
+    if pd.isna(u):
+        return ""
+    s = str(u).lower().strip()
+
+    # normalize visuals/aliases
+    s = (s.replace("²", "2").replace("³", "3")
+           .replace("sqm", "m2").replace("m^2", "m2").replace("m^3", "m3"))
+
+    # detect anywhere in the string
+    if "m3" in s: return "m3"
+    if "m2" in s: return "m2"
+    if "kg" in s: return "kg"
+    if "ton" in s or re.search(r"\b(t|tonne)\b", s): return "ton"
+    if re.search(r"\bpcs?\b|\bno\b|\bnr\b", s): return "pcs"
+    if re.search(r"\blm\b|\bm\b", s): return "m"
+
+    # fallback: left of '/'
+    if "/" in s:
+        left = s.split("/", 1)[0]
+        if "m3" in left: return "m3"
+        if "m2" in left: return "m2"
+        if "kg" in left: return "kg"
+        if "ton" in left or left.strip() == "t": return "ton"
+
+    return ""
+
+def steel_factors(activity_texts) -> np.ndarray:
+    """kg/m3 steel intensity per activity text (columns, slabs, foundations; slabs by default)."""
+    t = pd.Series(list(activity_texts), dtype=object).fillna("").astype(str).str.lower()
+    return np.select(
+        [t.str.contains("column", regex=False).to_numpy(bool),
+         t.str.contains("slab", regex=False).to_numpy(bool),
+         t.str.contains("foundation|footing|raft").to_numpy(bool)],
+        [steel_col_kgm3, steel_slab_kgm3, steel_found_kgm3],
+        default=steel_slab_kgm3,
+    ).astype(float)
+
+def quantities_by_unit(units, area, volume, weight, factors):
+    """
+    Quantity per row from its parsed unit (all arguments are aligned arrays):
+    m3 -> Volume
+    m2 -> Area
+    kg/ton -> Weight; if not present, estimate from Volume × steel factor (kg/m3)
+    Returns (qty array, basis list).
+    """
+    is_m3, is_m2 = units == "m3", units == "m2"
+    is_kg, is_ton = units == "kg", units == "ton"
+    steel = is_kg | is_ton
+    has_w, has_v = weight > 0, volume > 0
+
+    kg = np.where(has_w, weight, np.where(has_v, volume * factors, 0.0))
+    qty = np.select(
+        [is_m3, is_m2, steel],
+        [np.where(has_v, volume, 0.0), np.where(area > 0, area, 0.0), np.where(is_ton, kg / 1000.0, kg)],
+        default=0.0,
+    )
+
+    est_basis = ("Weight(est: " + pd.Series(factors).astype(str) + " kg/m3 × Volume) @ "
+                 + pd.Series(np.where(is_ton, "ton", "kg")) + "/day").to_numpy(object)
+    basis = np.select(
+        [is_m3, is_m2, steel & has_w & is_kg, steel & has_w, steel & has_v, steel],
+        ["Area @ m3/day (Volume)", "Area @ m2/day", "Weight(kg) @ kg/day",
+         "Weight(ton from kg) @ ton/day", est_basis, "Weight missing"],
+        default="None",
+    )
+    return qty, basis.tolist()
+
+def int_or(mask, values, fill):
+    """Mixed output column: int(values) where mask, fill elsewhere."""
+    out = np.full(len(mask), fill, dtype=object)
+    out[mask] = values[mask].astype(np.int64).tolist()
+    return out.tolist()
+
+# --------- Prepare embeddings ----------
+activity_names = activity_list_df[col_activity_name].astype(str).str.lower().tolist()
+dict_names = dictionary_df[dict_activity_name].astype(str).str.lower().tolist()
+
+print("Computing embeddings...")
+uniq_names, uniq_name_emb, name_inv = encode_unique(model, MODEL_NAME, activity_names, convert_to_tensor=True, normalize_embeddings=True)
+dict_emb = encode_cached(model, MODEL_NAME, dict_names, convert_to_tensor=True, normalize_embeddings=True)
+dict_feats = add_token_matrix(build_feature_table(dict_names))
+
+# Query text with (type/element) if available
+def _col_or_blank(name):
+    if name in activity_list_df.columns:
+        return activity_list_df[name]
+    return pd.Series("", index=activity_list_df.index)
+
+query_texts = [
+    normalize_text(f"{a} {t} {e}")
+    for a, t, e in zip(_col_or_blank(col_activity_name), _col_or_blank(col_type), _col_or_blank(col_element))
+]
+
+# --------- Matching (once per distinct activity / query text) ----------
+match_keys, key_inv = unique_inverse(zip(name_inv.tolist(), query_texts))
+key_best_idx, key_final_score, key_emb_sim = [], [], []
+key_flags, key_reason = [], []
+query_feats = build_feature_table([q for _, q in match_keys])
+
+for start in range(0, len(match_keys), OVERLAP_BLOCK):
+    overlaps = overlap_matrix(query_feats["tokens"][start:start + OVERLAP_BLOCK], dict_feats)
+
+    for off, (name_i, qtxt_norm) in enumerate(match_keys[start:start + OVERLAP_BLOCK]):
+        sims_t = util.pytorch_cos_sim(uniq_name_emb[name_i], dict_emb)[0]  # tensor of sims
+        sims = sims_t.cpu().numpy().ravel()
+
+        # Rank candidates with smart score
+        final = smart_scores(query_feats, start + off, dict_feats, sims, overlaps[off])
+        valid = final >= 0
+
+        # Fallback if all rejected
+        if not valid.any():
+            best_idx = int(np.argmax(sims))
+            final_score = float(sims[best_idx])
+            best_reason = "no candidate passed hard filters; used highest emb_sim"
+            best_flags = {"fallback": True}
+        else:
+            best_idx = int(np.argmax(np.where(valid, final, -np.inf)))   # first of ties, as the stable sort did
+            final_score, best_flags, best_reason = feature_match_score(qtxt_norm, dict_names[best_idx], float(sims[best_idx]))
+
+        key_best_idx.append(best_idx)
+        key_final_score.append(final_score)
+        key_emb_sim.append(round(float(sims[best_idx]), 3))
+        key_flags.append(str(best_flags))
+        key_reason.append(best_reason)
+
+# --------- Durations, crews and weights (columnar over rows) ----------
+best_rows = np.asarray(key_best_idx, dtype=np.int64)[key_inv]
+final_scores = np.asarray(key_final_score, dtype=float)[key_inv]
+matched = final_scores >= similarity_threshold   # threshold on final_score (smarter)
+
+# Pull dict values
+dict_units = dictionary_df[dict_unit_raw].map(norm_uom).to_numpy(object)   # e.g. "Area @ m2/day" -> "m2"
+units     = dict_units[best_rows]
+prod_rate = dictionary_df[dict_prod_rate].to_numpy(float)[best_rows]
+ref_dur   = dictionary_df[dict_ref_duration].to_numpy(float)[best_rows]
+
+crews  = np.maximum(activity_list_df["number of crews"].to_numpy(float), 1)
+area   = activity_list_df[col_area].to_numpy(float)
+volume = activity_list_df[col_volume].to_numpy(float)
+weight = activity_list_df[col_weight].to_numpy(float)
+
+# Quantity by unit (with steel estimation if needed)
+factors = steel_factors(activity_list_df[col_activity_name])
+qty, qty_basis = quantities_by_unit(units, area, volume, weight, factors)
+
+# Estimated Weight (kg) for output column
+est_weight = np.where(weight > 0, weight,
+                      np.where(np.isin(units, ["kg", "ton"]) & (volume > 0), volume * factors, 0.0))
+
+with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+    use_rate = matched & (prod_rate > 0) & (qty > 0)
+    use_ref  = matched & ~use_rate & (ref_dur > 0)
+    has_dur  = use_rate | use_ref
+
+    scaled = ref_dur * (qty / max(baseline_area, 1e-6))
+    raw = np.where(use_rate, qty / (prod_rate * crews), scaled / crews)
+    pre_cap = np.where(use_ref & ~(qty > 0), np.trunc(ref_dur), np.maximum(1, np.ceil(raw)))
+    duration = np.minimum(pre_cap, max_duration_days)
+
+    # Suggested crews if capped
+    capped  = has_dur & (pre_cap > max_duration_days)
+    by_rate = capped & (qty > 0) & (prod_rate > 0)
+    by_ref  = capped & ~by_rate & (qty > 0) & (ref_dur > 0)
+    crews_needed = np.where(by_rate, np.ceil(qty / (prod_rate * max_duration_days)),
+                            np.ceil(scaled / max_duration_days))
+    sug_raw = np.where(by_rate, qty / (prod_rate * crews_needed), scaled / np.maximum(crews_needed, 1))
+    suggested = by_rate | by_ref
+
+basis_list = np.select(
+    [use_rate, use_ref & (qty > 0), use_ref],
+    [np.asarray(qty_basis, dtype=object),
+     np.asarray(["Reference-Scaled (" + b + ")" for b in qty_basis], dtype=object),
+     "Reference"],
+    default="Manual Review",
+).tolist()
+
+dict_names_raw = dictionary_df[dict_activity_name].to_numpy(object)
+matched_names = np.where(matched, dict_names_raw[best_rows], "No Match").tolist()
+matched_scores = [round(s, 3) for s in key_final_score]
+matched_scores = [matched_scores[k] for k in key_inv]
+durations = int_or(has_dur, duration, "Manual Review")
+origin_pre_cap_list = int_or(has_dur, pre_cap, "N/A")
+suggested_crews_list = int_or(suggested, crews_needed, "N/A")
+suggested_durations = int_or(suggested, np.maximum(1, np.ceil(sug_raw)), "N/A")
+estimated_weight_kg_list = [round(w, 4) for w in est_weight.tolist()]   # Python round, as before
+
+embedding_sim_list = [key_emb_sim[k] for k in key_inv]
+match_flags_list = [key_flags[k] for k in key_inv]
+match_reason_list = [key_reason[k] for k in key_inv]
+parsed_unit_list = units.tolist()   # DEBUG (PATCHED)
+qty_used_list = qty.tolist()
+
+# --------- Add results ----------
+activity_list_df["matched activity"] = matched_names
+activity_list_df["similarity score"] = matched_scores              # final (smart) score
+activity_list_df["embedding similarity"] = embedding_sim_list      # raw cosine for مراجعة
+activity_list_df["match_flags"] = match_flags_list
+activity_list_df["match_reason"] = match_reason_list
+activity_list_df["unit (parsed)"] = parsed_unit_list               # (PATCHED) تشخيص
+activity_list_df["qty (used)"] = qty_used_list                     # (PATCHED) تشخيص
+activity_list_df["basis"] = basis_list
+activity_list_df["origin duration (pre-cap)"] = origin_pre_cap_list
+activity_list_df["duration (days)"] = durations
+activity_list_df["suggested crews (to meet max)"] = suggested_crews_list
+activity_list_df["suggested duration (days)"] = suggested_durations
+activity_list_df["activity duration (final)"] = activity_list_df["duration (days)"]
+
+# --- Insert 'Estimated Weight (kg)' after 'Volume'
+insert_after = col_volume
+new_col_name = "Estimated Weight (kg)"
+estimated_weight_series = pd.to_numeric(pd.Series(estimated_weight_kg_list), errors="coerce").fillna(0).round(4)
+
+if insert_after in activity_list_df.columns:
+    cols = activity_list_df.columns.tolist()
+    if new_col_name in cols:
+        cols.remove(new_col_name)
+        if new_col_name in activity_list_df.columns:
+            activity_list_df.drop(columns=[new_col_name], inplace=True)
+    activity_list_df[new_col_name] = estimated_weight_series
+    cols = activity_list_df.columns.tolist()
+    cols.remove(new_col_name)
+    insert_pos = cols.index(insert_after) + 1
+    cols = cols[:insert_pos] + [new_col_name] + cols[insert_pos:]
+    activity_list_df = activity_list_df[cols]
+else:
+    activity_list_df[new_col_name] = estimated_weight_series
+
+# keep tail order for duration-related columns
+desired_tail = ["origin duration (pre-cap)", "duration (days)", "suggested crews (to meet max)",
+                "suggested duration (days)", "activity duration (final)"]
+cols_tail_first = [c for c in activity_list_df.columns if c not in desired_tail] + desired_tail
+activity_list_df = activity_list_df[cols_tail_first]
+
+# --------- Save output ----------
+print("Select location to save output...")
+output_filename = filedialog.asksaveasfilename(
+    title="Save Output File",
+    defaultextension=".xlsx",
+    filetypes=[("Excel files", "*.xlsx")],
+    initialfile="Updated_Activity_List.xlsx"
+)
+if output_filename:
+    activity_list_df.to_excel(output_filename, index=False)
+    print(f"Results saved in: {output_filename}")
+else:
+    print("Save cancelled.")
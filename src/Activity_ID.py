@@ -1,129 +1,149 @@
-import os
-import subprocess
-import sys
-import pandas as pd
-import tkinter as tk
-from tkinter import filedialog
-
-# ✅ Function to check and install required libraries
-def install_if_missing(library):
-    try:
-        __import__(library)
-    except ImportError:
-        print(f"⚠️ '{library}' not found. Installing...")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", library])
-        print(f"✅ '{library}' installed successfully!")
-
-# ✅ Ensure required libraries are installed
-install_if_missing("pandas")
-install_if_missing("openpyxl")  # Needed for Excel operations
-
-# ✅ Now we can import them safely
-import pandas as pd
-
-# ✅ Initialize Tkinter and hide root window
-root = tk.Tk()
-root.withdraw()  # Hide main window
-
-# ✅ Open file selection dialog
-file_path = filedialog.askopenfilename(title="Select Excel File (Activity List & Reference)", 
-                                       filetypes=[("Excel Files", "*.xlsx *.xls")])
-if not file_path:
-    print("❌ No file selected, operation aborted.")
-    exit()
-
-# ✅ Load both sheets from Excel
-df_activities = pd.read_excel(file_path, sheet_name="Activity List")
-df_reference = pd.read_excel(file_path, sheet_name="Reference Dictionary")
-
-# ✅ Ensure there are no NaN values in lookup tables
-df_reference = df_reference.fillna("")  # Use empty string instead of GN
-
-# ✅ Extract reference codes from sheet
-# Convert dictionary to lookup tables
-floor_codes = dict(zip(df_reference["Floor Name"].astype(str).str.lower(), df_reference["Floor Code"]))
-phase_codes = dict(zip(df_reference["Phase Name"].astype(str).str.lower(), df_reference["Phase Code"]))
-building_codes = dict(zip(df_reference["Building Name"].astype(str).str.lower(), df_reference["Building Code"]))
-
-# ✅ Print available building names for debugging
-print("\n📌 Available Buildings in Reference Dictionary:")
-print(building_codes.keys())
-
-# ✅ Function to extract floor code from activity name
-def get_floor_code(activity_name):
-    if pd.isna(activity_name):  
-        return "GN"
-    
-    activity_name = str(activity_name).lower()
-    
-    for floor, code in floor_codes.items():
-        if str(floor).lower() in activity_name:
-            return code
-    return "GN"  
-
-# ✅ Function to extract phase code from activity name
-def get_phase_code(activity_name):
-    if pd.isna(activity_name):  
-        return "GEN"
-    
-    activity_name = str(activity_name).lower()
-    
-    for phase, code in phase_codes.items():
-        if str(phase).lower() in activity_name:
-            return code
-    return "GEN"  
-
-# ✅ Function to extract building code from activity name (remove if not found)
-def get_building_code(activity_name):
-    if pd.isna(activity_name):  
-        return ""  # Return empty string if no match
-    
-    activity_name = str(activity_name).lower()  
-
-    for building, code in building_codes.items():
-        if str(building).lower() in activity_name:
-            print(f"✅ Found Building: {building} -> {code}")  # Debugging
-            return code
-    
-    print(f"⚠️ No Building Found for: {activity_name}, skipping building code.")  # Debugging
-    return ""  # Return empty if no match found
-
-# ✅ Generate Activity ID for each row (without `Building Code` if not found)
-activity_ids = []
-
-for i, row in df_activities.iterrows():
-    activity_name = row["Activity Name"]
-    floor_code = get_floor_code(activity_name)
-    phase_code = get_phase_code(activity_name)
-    
-    # Get building code (may be empty)
-    building_code = get_building_code(activity_name)
-    
-    task_number = str(10 + (i * 5)).zfill(3)  # 🔥 Task Number starts from 10 and increases by 5
-    
-    # 🛠 **Create Activity ID without `Building Code` if it's empty**
-    if building_code:
-        activity_id = f"{building_code}-{floor_code}-{phase_code}-{task_number}"
-    else:
-        activity_id = f"{floor_code}-{phase_code}-{task_number}"
-    
-    activity_ids.append(activity_id)
-
-# ✅ Insert the new column **before** "Activity Name"
-df_activities.insert(0, "Activity ID", activity_ids)
-
-# ✅ Open save file dialog
-output_path = filedialog.asksaveasfilename(title="Select Save Location", defaultextension=".xlsx",
-                                           filetypes=[("Excel Files", "*.xlsx *.xls")])
-
-if not output_path:
-    print("❌ No save location selected, operation aborted.")
-    exit()
-
-# ✅ Save the modified file
-df_activities.to_excel(output_path, index=False)
-
-# ✅ Open the file automatically after saving
-os.system(f'start EXCEL.EXE \"{output_path}\"')  
-
-print(f"\n✅ Activity IDs generated successfully! File saved at: {output_path}")
+import os
+import subprocess
+import sys
+import pandas as pd
+import tkinter as tk
+from tkinter import filedialog, messagebox
+from Keyword_Matcher import KeywordMatcher
+from Activity_Registry import ActivityRegistry, content_key, remembered_registry, remember_registry
+
+# ✅ Function to check and install required libraries
+def install_if_missing(library):
+    try:
+        __import__(library)
+    except ImportError:
+        print(f"⚠️ '{library}' not found. Installing...")
+        subprocess.check_call([sys.executable, "-m", "pip", "install", library])
+        print(f"✅ '{library}' installed successfully!")
+
+# ✅ Ensure required libraries are installed
+install_if_missing("pandas")
+install_if_missing("openpyxl")  # Needed for Excel operations
+
+# ✅ Now we can import them safely
+import pandas as pd
+
+# ✅ Initialize Tkinter and hide root window
+root = tk.Tk()
+root.withdraw()  # Hide main window
+
+# ✅ Open file selection dialog
+file_path = filedialog.askopenfilename(title="Select Excel File (Activity List & Reference)", 
+                                       filetypes=[("Excel Files", "*.xlsx *.xls")])
+if not file_path:
+    print("❌ No file selected, operation aborted.")
+    exit()
+
+# ✅ Load both sheets from Excel
+df_activities = pd.read_excel(file_path, sheet_name="Activity List")
+df_reference = pd.read_excel(file_path, sheet_name="Reference Dictionary")
+
+# ✅ Ensure there are no NaN values in lookup tables
+df_reference = df_reference.fillna("")  # Use empty string instead of GN
+
+# ✅ Extract reference codes from sheet
+# Convert dictionary to lookup tables
+floor_codes = dict(zip(df_reference["Floor Name"].astype(str).str.lower(), df_reference["Floor Code"]))
+phase_codes = dict(zip(df_reference["Phase Name"].astype(str).str.lower(), df_reference["Phase Code"]))
+building_codes = dict(zip(df_reference["Building Name"].astype(str).str.lower(), df_reference["Building Code"]))
+
+# ✅ Print available building names for debugging
+print("\n📌 Available Buildings in Reference Dictionary:")
+print(building_codes.keys())
+
+# ✅ Compile all reference names into one multi-pattern matcher (first listed name wins, as before)
+floor_keys = list(floor_codes)
+phase_keys = list(phase_codes)
+building_keys = list(building_codes)
+matcher = KeywordMatcher([floor_keys, phase_keys, building_keys])
+
+# ✅ Floor, phase and building codes of one activity name in a single pass
+def get_codes(activity_name):
+    if pd.isna(activity_name):
+        return "GN", "GEN", ""  # building: empty string if no match
+
+    f, p, b = matcher.first_matches(str(activity_name).lower())
+    return (
+        floor_codes[floor_keys[f]] if f is not None else "GN",
+        phase_codes[phase_keys[p]] if p is not None else "GEN",
+        building_codes[building_keys[b]] if b is not None else "",
+    )
+
+# ✅ Match each distinct activity name once
+name_idx, unique_names = pd.factorize(df_activities["Activity Name"])
+unique_codes = [get_codes(name) for name in unique_names]
+row_codes = [unique_codes[k] if k >= 0 else get_codes(None) for k in name_idx]
+
+# ✅ Stable task numbers from the project's ID registry (remembered between runs, whatever the export is called):
+#    unchanged activities keep their number, new ones take free slots of 10, 15, 20, ...
+registry_path = remembered_registry()
+if not (registry_path and messagebox.askyesno("ID Registry", f"Keep the Activity IDs of this project registry?\n\n{registry_path}")):
+    registry_path = filedialog.askopenfilename(title="Select the project's ID registry (Cancel to start a new one)",
+                                               initialdir=os.path.dirname(file_path),
+                                               filetypes=[("ID registry", "*.json")])
+    if not registry_path:
+        registry_path = filedialog.asksaveasfilename(title="Create a new ID registry for this project",
+                                                     initialdir=os.path.dirname(file_path),
+                                                     initialfile="project_id_registry.json", defaultextension=".json",
+                                                     filetypes=[("ID registry", "*.json")])
+    if not registry_path:
+        print("❌ No ID registry selected, operation aborted.")
+        exit()
+try:
+    registry = ActivityRegistry(registry_path)
+except ValueError as e:
+    messagebox.showerror("ID Registry", str(e))
+    exit()
+names = df_activities["Activity Name"].tolist()
+task_numbers = registry.assign(
+    [content_key(name, *codes) for name, codes in zip(names, row_codes)],
+    labels=["" if pd.isna(name) else str(name) for name in names],
+)
+print(f"\n🗂️ ID registry: {registry.stats['reused']} reused, {registry.stats['new']} new, "
+      f"{registry.stats['retired']} retired ({registry.path})")
+
+# ✅ Generate Activity ID for each row (without `Building Code` if not found)
+activity_ids = []
+no_building = []
+
+for k, (floor_code, phase_code, building_code), number in zip(name_idx, row_codes, task_numbers):
+    task_number = str(number).zfill(3)  # 🔥 Task Number from the registry (starts from 10, step 5)
+
+    # 🛠 **Create Activity ID without `Building Code` if it's empty**
+    if building_code:
+        activity_id = f"{building_code}-{floor_code}-{phase_code}-{task_number}"
+    else:
+        activity_id = f"{floor_code}-{phase_code}-{task_number}"
+        no_building.append(k)
+
+    activity_ids.append(activity_id)
+
+# ✅ Summary instead of per-row debug lines
+n_rows = len(activity_ids)
+print(f"\n📊 Building code found for {n_rows - len(no_building)} / {n_rows} activities.")
+if no_building:
+    missing = sorted({str(unique_names[k]).lower() if k >= 0 else "(empty)" for k in no_building})
+    print(f"⚠️ No building found for {len(missing)} distinct activity name(s), skipping building code, e.g.:")
+    for name in missing[:10]:
+        print(f"   - {name}")
+
+# ✅ Insert the new column **before** "Activity Name"
+df_activities.insert(0, "Activity ID", activity_ids)
+
+# ✅ Open save file dialog
+output_path = filedialog.asksaveasfilename(title="Select Save Location", defaultextension=".xlsx",
+                                           filetypes=[("Excel Files", "*.xlsx *.xls")])
+
+if not output_path:
+    print("❌ No save location selected, operation aborted.")
+    exit()
+
+# ✅ Save the modified file, then remember the IDs it carries
+df_activities.to_excel(output_path, index=False)
+registry.save()
+remember_registry(registry.path)
+
+# ✅ Open the file automatically after saving
+os.system(f'start EXCEL.EXE \"{output_path}\"')  
+
+print(f"\n✅ Activity IDs generated successfully! File saved at: {output_path}")
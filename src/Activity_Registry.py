@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent Activity ID registry used by Activity_ID.
+
+Every activity is keyed by a hash of its content (activity name, floor, phase,
+building codes). Re-running on a revised BIM export gives unchanged
+activities their previous task number; only new or changed activities get
+new numbers, taken from the lowest free slot of the 10, 15, 20, ... grid.
+Identical rows are told apart by their order of appearance.
+Activities that disappear are kept as retired, so their numbers are not
+handed to a different activity later (use `purge` to release them).
+
+The registry is one JSON file per project, chosen when Activity_ID first runs
+and remembered (LAST_REGISTRY_FILE), so a revised export saved under a new name
+still gets its previous numbers.
+
+Maintenance:
+    python Activity_Registry.py info  <registry.json>
+    python Activity_Registry.py purge <registry.json>
+"""
+import hashlib
+import heapq
+import json
+import os
+import re
+import sys
+import unicodedata
+from datetime import date
+
+START_NUMBER = 10
+NUMBER_STEP = 5
+LAST_REGISTRY_FILE = os.path.join(os.path.expanduser("~"), ".activity_id_registry")
+
+
+# ===== Keys =====
+def _norm(value) -> str:
+    s = unicodedata.normalize("NFC", "" if value is None else str(value))
+    return re.sub(r"\s+", " ", s).strip().lower()
+
+def content_key(name, floor_code, phase_code, building_code) -> str:
+    raw = "\x1f".join(_norm(v) for v in (name, floor_code, phase_code, building_code))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def remembered_registry():
+    """Registry used last time, if it still exists."""
+    try:
+        with open(LAST_REGISTRY_FILE, "r", encoding="utf-8") as f:
+            path = f.read().strip()
+    except OSError:
+        return None
+    return path if path and os.path.isfile(path) else None
+
+def remember_registry(path):
+    try:
+        with open(LAST_REGISTRY_FILE, "w", encoding="utf-8") as f:
+            f.write(os.path.abspath(path))
+    except OSError:
+        pass
+
+
+# ===== Registry =====
+class ActivityRegistry:
+    def __init__(self, path, start=START_NUMBER, step=NUMBER_STEP):
+        self.path = path
+        self.start, self.step = start, step
+        self.entries = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.start, self.step = int(data["start"]), int(data["step"])
+            self.entries = data["entries"]
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError) as e:      # json.JSONDecodeError is a ValueError
+            raise ValueError(f"ID registry '{path}' is damaged ({e}). Restore it from a backup or pick another one.") from e
+        self._index_numbers()
+        self.stats = {"reused": 0, "new": 0, "retired": 0}
+
+    def _index_numbers(self):
+        """Free slots below the highest number in use, plus the next number after it."""
+        used = {e["number"] for e in self.entries.values()}
+        top = max(used, default=self.start - self.step)
+        self._free = [n for n in range(self.start, top, self.step) if n not in used]
+        heapq.heapify(self._free)
+        self._next = top + self.step
+
+    def _allocate(self):
+        if self._free:
+            return heapq.heappop(self._free)
+        n = self._next
+        self._next += self.step
+        return n
+
+    def assign(self, keys, labels=None):
+        """
+        Task number for every content key (duplicates get one number each, by occurrence).
+        Entries not among keys are marked retired.
+        """
+        today = date.today().isoformat()
+        seen, numbers, fresh = {}, [None] * len(keys), []
+        for i, key in enumerate(keys):
+            k = seen.get(key, 0)
+            seen[key] = k + 1
+            slot = f"{key}#{k}"
+            entry = self.entries.get(slot)
+            if entry is None:
+                fresh.append((i, slot))
+                continue
+            entry["active"], entry["last_seen"] = True, today
+            numbers[i] = entry["number"]
+            self.stats["reused"] += 1
+
+        for i, slot in fresh:    # after reuse, so a new row never takes a kept number
+            n = self._allocate()
+            self.entries[slot] = {"number": n, "label": labels[i] if labels else "",
+                                  "active": True, "last_seen": today}
+            numbers[i] = n
+            self.stats["new"] += 1
+
+        active = {f"{key}#{k}" for key, c in seen.items() for k in range(c)}
+        for slot, entry in self.entries.items():
+            if slot not in active and entry.get("active", True):
+                entry["active"] = False
+                self.stats["retired"] += 1
+        return numbers
+
+    def purge(self):
+        """Forget retired entries so their numbers can be reused."""
+        before = len(self.entries)
+        self.entries = {k: e for k, e in self.entries.items() if e.get("active", True)}
+        self._index_numbers()
+        return before - len(self.entries)
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"start": self.start, "step": self.step, "entries": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+# -----------------------------
+# Run
+# -----------------------------
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("info", "purge"):
+        print(__doc__)
+        raise SystemExit
+    try:
+        reg = ActivityRegistry(sys.argv[2])
+    except ValueError as e:
+        print(e)
+        raise SystemExit(1)
+    if sys.argv[1] == "purge":
+        print(f"Released {reg.purge()} retired number(s).")
+        reg.save()
+    active = sum(1 for e in reg.entries.values() if e.get("active", True))
+    print(f"{len(reg.entries)} entries: {active} active, {len(reg.entries) - active} retired; "
+          f"next number {reg._next}, {len(reg._free)} free slot(s) below it.")
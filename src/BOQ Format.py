@@ -1,91 +1,228 @@
-import pandas as pd
-import re
-from tkinter import Tk, filedialog
-
-# Function to select file using GUI
-def select_file():
-    root = Tk()
-    root.withdraw()  # Hide main window
-    file_path = filedialog.askopenfilename(filetypes=[("Excel Files", "*.xlsx"), ("CSV Files", "*.csv")])
-    return file_path
-
-# Function to save file using GUI
-def save_file():
-    root = Tk()
-    root.withdraw()
-    file_path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel Files", "*.xlsx")])
-    return file_path
-
-# Regular expression to extract element name
-regex_pattern = re.compile(r"Name=(.*?),")
-
-# Select input file
-file_path = select_file()
-if not file_path:
-    print("No file selected. Process canceled.")
-    exit()
-
-# Load the workbook
-xls = pd.ExcelFile(file_path)
-output_data = []
-
-# Process each sheet
-for sheet_name in xls.sheet_names:
-    df = pd.read_excel(xls, sheet_name=sheet_name)
-    
-    # Check if the sheet is empty
-    if df.empty or df.shape[1] == 0:
-        print(f"⚠️ Warning: Sheet '{sheet_name}' is empty or has no columns. Skipping...")
-        continue
-    
-    # Print available columns for debugging
-    print(f"📜 Sheet '{sheet_name}' columns: {list(df.columns)}")
-    
-    # Identify columns dynamically
-    col_map = {col.lower(): col for col in df.columns}  # Create a dictionary for columns
-    col_element = next((col for col in df.columns if "element" in col.lower()), None)
-    col_area = col_map.get("area", None)
-    col_volume = col_map.get("volume", None)
-    
-    # If 'Element Name' column is not found, ask the user for input
-    if not col_element:
-        print(f"⚠️ Warning: Sheet '{sheet_name}' does not have an 'Element Name' column.")
-        print(f"📜 Available columns: {list(df.columns)}")
-        col_element = input("👉 Please enter the correct column name for Element Name (or press Enter to skip): ").strip()
-        if col_element not in df.columns:
-            print(f"🚫 Skipping sheet '{sheet_name}' due to missing column.")
-            continue
-    
-    # Fill missing area/volume with 0 if necessary
-    if col_area is None:
-        df["area"] = 0
-        col_area = "area"
-    if col_volume is None:
-        df["volume"] = 0
-        col_volume = "volume"
-    
-    # Extract element names
-    df["element_name"] = df[col_element].astype(str).str.extract(regex_pattern)
-    df.dropna(subset=["element_name"], inplace=True)  # Remove rows with no valid name
-    
-    # Aggregate data
-    aggregated = df.groupby("element_name").agg(
-        total_area=(col_area, "sum"),
-        total_volume=(col_volume, "sum"),
-        count=("element_name", "count")
-    ).reset_index()
-    
-    # Add sheet name column
-    aggregated.insert(0, "Sheet Name", sheet_name)
-    output_data.append(aggregated)
-
-# Combine all results
-if output_data:
-    final_df = pd.concat(output_data, ignore_index=True)
-    
-    # Save output file
-    save_path = save_file() or "Aggregated_Data.xlsx"  # Default save file if user cancels
-    final_df.to_excel(save_path, index=False)
-    print(f"Processing complete. File saved to: {save_path}")
-else:
-    print("No valid data found to process.")
+import pandas as pd
+import re
+import os
+import hashlib
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from tkinter import Tk, filedialog
+
+# Function to select file using GUI
+def select_file():
+    root = Tk()
+    root.withdraw()  # Hide main window
+    file_path = filedialog.askopenfilename(filetypes=[("Excel Files", "*.xlsx"), ("CSV Files", "*.csv")])
+    return file_path
+
+# Function to save file using GUI
+def save_file():
+    root = Tk()
+    root.withdraw()
+    file_path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel Files", "*.xlsx")])
+    return file_path
+
+# Regular expression to extract element name
+regex_pattern = re.compile(r"Name=(.*?),")
+
+# Aggregated sheets are cached next to the input as <workbook>_boq_cache/<sheet hash>-<version>.<kind>.csv
+# (kind: aggregated, empty, or raw = no element column, re-read to ask for it). Plain CSV only, never
+# pickles, since the folder may be shared. Bump CACHE_VERSION when aggregate() changes; the regex is
+# part of the version already.
+CACHE_SUFFIX = "_boq_cache"
+CACHE_VERSION = 2
+CACHE_KINDS = ("aggregated", "empty", "raw")
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PKG = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+SHARED_STRING_REF = re.compile(rb'(<c [^>]*t="s"[^>]*>\s*<v>)(\d+)(</v>)')
+SHARED_STRING_ITEM = re.compile(rb"<si>.*?</si>|<si/>", re.S)
+
+# Function to hash every sheet's content straight from the xlsx package
+def sheet_hashes(file_path):
+    """
+    {sheet name: hash of its XML (shared string indices replaced by the strings) + styles},
+    without parsing cells, so a sheet keeps its hash when another sheet adds strings.
+    Empty dict if the file is not an xlsx package (nothing gets cached then).
+    """
+    try:
+        with zipfile.ZipFile(file_path) as z:
+            names = set(z.namelist())
+            rels = {r.get("Id"): r.get("Target") for r in ET.fromstring(z.read("xl/_rels/workbook.xml.rels")).iter(f"{NS_PKG}Relationship")}
+            shared = SHARED_STRING_ITEM.findall(z.read("xl/sharedStrings.xml")) if "xl/sharedStrings.xml" in names else []
+            styles = z.read("xl/styles.xml") if "xl/styles.xml" in names else b""
+
+            hashes = {}
+            for sheet in ET.fromstring(z.read("xl/workbook.xml")).iter(f"{NS_MAIN}sheet"):
+                target = rels[sheet.get(f"{NS_REL}id")]
+                part = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+                xml = SHARED_STRING_REF.sub(lambda m: m.group(1) + shared[int(m.group(2))] + m.group(3), z.read(part))
+                h = hashlib.sha1(xml)
+                h.update(styles)
+                hashes[sheet.get("name")] = h.hexdigest()
+            return hashes
+    except (zipfile.BadZipFile, KeyError, IndexError, ET.ParseError):
+        return {}
+
+# Function to find the element / area / volume columns of a sheet (element is None if not found)
+def find_columns(df):
+    col_map = {col.lower(): col for col in df.columns}  # Create a dictionary for columns
+    col_element = next((col for col in df.columns if "element" in col.lower()), None)
+    return col_element, col_map.get("area", None), col_map.get("volume", None)
+
+# Function to aggregate one sheet by element name
+def aggregate(df, col_element, col_area, col_volume):
+    # Fill missing area/volume with 0 if necessary
+    if col_area is None:
+        df["area"] = 0
+        col_area = "area"
+    if col_volume is None:
+        df["volume"] = 0
+        col_volume = "volume"
+    
+    # Extract element names
+    df["element_name"] = df[col_element].astype(str).str.extract(regex_pattern)
+    df.dropna(subset=["element_name"], inplace=True)  # Remove rows with no valid name
+    
+    # Aggregate data
+    return df.groupby("element_name").agg(
+        total_area=(col_area, "sum"),
+        total_volume=(col_volume, "sum"),
+        count=("element_name", "count")
+    ).reset_index()
+
+# Version part of the cache file names: changes with CACHE_VERSION or the element regex
+def cache_version():
+    return hashlib.sha1(f"{CACHE_VERSION}:{regex_pattern.pattern}".encode("utf-8")).hexdigest()[:8]
+
+# Function to write one cache entry (kind in the file name; only aggregated tables carry data)
+def write_cache(cache_stem, kind, data):
+    path = f"{cache_stem}.{kind}.csv"
+    tmp = path + ".tmp"
+    if kind == "aggregated":
+        data.to_csv(tmp, index=False)
+    else:
+        open(tmp, "w").close()
+    os.replace(tmp, path)   # never leave a half-written entry behind
+
+# Function to read one cache entry back; raw sheets are read again from the workbook
+def read_cache(path, file_path, sheet_name):
+    kind = path.rsplit(".", 2)[-2]
+    if kind == "aggregated":
+        return kind, pd.read_csv(path, dtype={"element_name": str}, keep_default_na=False,
+                                 float_precision="round_trip")
+    if kind == "raw":
+        return kind, pd.read_excel(file_path, sheet_name=sheet_name)
+    return kind, None
+
+# Function to parse and aggregate one sheet (runs in a worker process)
+def parse_sheet(file_path, sheet_name, cache_stem):
+    """
+    ("empty", None), ("aggregated", table) or ("raw", sheet) when the element column must be
+    asked for; also written to the cache when cache_stem is given.
+    """
+    df = pd.read_excel(file_path, sheet_name=sheet_name)
+    if df.empty or df.shape[1] == 0:
+        result = ("empty", None)
+    else:
+        # Print available columns for debugging
+        print(f"📜 Sheet '{sheet_name}' columns: {list(df.columns)}")
+        col_element, col_area, col_volume = find_columns(df)
+        result = ("aggregated", aggregate(df, col_element, col_area, col_volume)) if col_element else ("raw", df)
+    if cache_stem:
+        write_cache(cache_stem, *result)
+    return result
+
+# Function to load every sheet, parsing and aggregating only the ones not cached yet
+def load_sheets(file_path):
+    sheet_names = pd.ExcelFile(file_path).sheet_names
+    hashes = sheet_hashes(file_path)
+    cache_dir = os.path.splitext(file_path)[0] + CACHE_SUFFIX
+    if hashes:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            if not os.access(cache_dir, os.W_OK):
+                raise PermissionError(f"'{cache_dir}' is read-only")
+        except OSError as e:
+            print(f"⚠️ No sheet cache ({e}); parsing every sheet.")
+            hashes = {}
+    version = cache_version()
+    stems = {n: os.path.join(cache_dir, f"{hashes[n]}-{version}") if n in hashes else None for n in sheet_names}
+    cached = {}
+    if hashes:
+        files = set(os.listdir(cache_dir))
+        for n, stem in stems.items():
+            for kind in CACHE_KINDS:
+                if stem and f"{os.path.basename(stem)}.{kind}.csv" in files:
+                    cached[n] = f"{stem}.{kind}.csv"
+
+    todo = [n for n in sheet_names if n not in cached]
+    print(f"📦 {len(cached)} sheet(s) from cache, {len(todo)} to parse")
+    parsed = {}
+    if todo:
+        with ProcessPoolExecutor(max_workers=min(len(todo), os.cpu_count() or 1)) as pool:
+            futures = {n: pool.submit(parse_sheet, file_path, n, stems[n]) for n in todo}
+            parsed = {n: f.result() for n, f in futures.items()}
+
+    # Drop cache entries of sheets that changed or no longer exist, and older cache formats
+    if hashes:
+        keep = {f"{os.path.basename(stem)}.{k}.csv" for stem in stems.values() for k in CACHE_KINDS}
+        for f in os.listdir(cache_dir):
+            if f.endswith((".csv", ".tmp", ".pkl")) and f not in keep:
+                os.remove(os.path.join(cache_dir, f))
+
+    for n in sheet_names:
+        yield (n, *(parsed[n] if n in parsed else read_cache(cached[n], file_path, n)))
+
+# Function to finish one loaded sheet: asks for the element column when it was not found
+def aggregate_sheet(sheet_name, kind, data):
+    # Check if the sheet is empty
+    if kind == "empty":
+        print(f"⚠️ Warning: Sheet '{sheet_name}' is empty or has no columns. Skipping...")
+        return None
+    
+    if kind == "raw":
+        # If 'Element Name' column is not found, ask the user for input
+        df = data
+        _, col_area, col_volume = find_columns(df)
+        print(f"⚠️ Warning: Sheet '{sheet_name}' does not have an 'Element Name' column.")
+        print(f"📜 Available columns: {list(df.columns)}")
+        col_element = input("👉 Please enter the correct column name for Element Name (or press Enter to skip): ").strip()
+        if col_element not in df.columns:
+            print(f"🚫 Skipping sheet '{sheet_name}' due to missing column.")
+            return None
+        data = aggregate(df.copy(), col_element, col_area, col_volume)
+    
+    # Add sheet name column
+    aggregated = data.copy()
+    aggregated.insert(0, "Sheet Name", sheet_name)
+    return aggregated
+
+def main():
+    # Select input file
+    file_path = select_file()
+    if not file_path:
+        print("No file selected. Process canceled.")
+        exit()
+
+    # Process each sheet
+    output_data = []
+    for sheet_name, kind, data in load_sheets(file_path):
+        aggregated = aggregate_sheet(sheet_name, kind, data)
+        if aggregated is not None:
+            output_data.append(aggregated)
+
+    # Combine all results
+    if output_data:
+        final_df = pd.concat(output_data, ignore_index=True)
+        
+        # Save output file
+        save_path = save_file() or "Aggregated_Data.xlsx"  # Default save file if user cancels
+        final_df.to_excel(save_path, index=False)
+        print(f"Processing complete. File saved to: {save_path}")
+    else:
+        print("No valid data found to process.")
+
+if __name__ == "__main__":
+    main()
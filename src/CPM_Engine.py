@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+Critical path method engine used by Crashing_Duration.
+
+Activities are positions 0..n-1; relationships (FS, SS, FF, SF with a lag) are
+kept as array-backed CSR adjacency in topological order. Both passes
+work on start times only, since every relationship type is one inequality
+
+    S[succ] >= S[pred] + lag + (d[pred] if it leaves the finish) - (d[succ] if it enters the finish)
+
+so the forward pass is a longest path in topological order and the backward pass
+the mirror image from the project finish.
+
+Durations may be one schedule, shape (n,), or k schedules at once, shape (k, n)
+(e.g. sampled durations); results have the same shape. Batches, and networks with
+few topological levels, are run one level at a time as array operations; a single
+schedule on a deep (mostly serial) network is run edge by edge over the CSR lists.
+
+Benchmark:
+    python CPM_Engine.py [activities]
+"""
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+REL_TYPES = ("FS", "SS", "FF", "SF")
+FLOAT_TOL = 1e-9
+LEVEL_COST_EDGES = 64     # one level pass costs about as much as this many single-edge steps
+
+Schedule = namedtuple("Schedule", "es ef ls lf total_float finish")
+
+
+def rel_code(rel) -> int:
+    """Index in REL_TYPES; accepts 'FS', 'pr_ss' (P6 export) ...; blank means FS."""
+    if rel is None or (isinstance(rel, float) and np.isnan(rel)):
+        return 0
+    s = str(rel).strip().upper()
+    if s.startswith("PR_"):
+        s = s[3:]
+    if not s:
+        return 0
+    if s not in REL_TYPES:
+        raise ValueError(f"Unknown relationship type: {rel!r}")
+    return REL_TYPES.index(s)
+
+
+class CPMNetwork:
+    def __init__(self, n, pred, succ, rel=None, lag=None):
+        """
+        n: number of activities; pred/succ: position arrays (one entry per relationship);
+        rel: relationship types (names or REL_TYPES codes, default FS); lag: in duration units.
+        Raises ValueError if the relationships contain a cycle.
+        """
+        self.n = n
+        pred = np.asarray(pred, dtype=np.int64)
+        succ = np.asarray(succ, dtype=np.int64)
+        m = len(pred)
+        rel = np.zeros(m, np.int8) if rel is None else np.array(
+            [r if isinstance(r, (int, np.integer)) else rel_code(r) for r in rel], dtype=np.int8)
+        lag = np.zeros(m) if lag is None else np.nan_to_num(np.asarray(lag, dtype=float))
+        self.pred, self.succ, self.rel, self.lag = pred, succ, rel, lag
+
+        # CSR adjacency: edges into each node (by successor) and out of each node (by predecessor)
+        self._in = self._csr(succ, pred)
+        self._out = self._csr(pred, succ)
+
+        # topological order and levels (Kahn); level[v] = 1 + max level of its predecessors
+        ptr, out_nodes = self._out[0].tolist(), self._out[2].tolist()
+        indeg = np.bincount(succ, minlength=n).tolist()
+        level = [0] * n
+        topo = [v for v in range(n) if indeg[v] == 0]
+        for u in topo:                              # topo grows while it is walked
+            lu = level[u] + 1
+            for e in range(ptr[u], ptr[u + 1]):
+                v = out_nodes[e]
+                if level[v] < lu:
+                    level[v] = lu
+                indeg[v] -= 1
+                if indeg[v] == 0:
+                    topo.append(v)
+        if len(topo) < n:
+            raise ValueError(f"Relationships contain a cycle ({n - len(topo)} activities cannot be ordered).")
+        self.topo = topo
+        self.level = np.asarray(level, dtype=np.int64)
+        self.n_levels = int(self.level.max()) + 1 if n else 0
+
+        self._from_finish = np.isin(rel, (0, 2))  # FS, FF
+        self._to_finish = np.isin(rel, (2, 3))    # FF, SF
+        self._has_to_finish = bool(self._to_finish.any())
+        self._fwd = self._bwd = None              # level groups, built on first use
+
+    @classmethod
+    def from_ids(cls, ids, pred_ids, succ_ids, rel=None, lag=None):
+        """
+        Network over activity IDs. Links to unknown IDs and self-links are dropped.
+        Returns (network, number of dropped links); raises ValueError on duplicate IDs,
+        since links could not tell those activities apart.
+        """
+        pos = {a: i for i, a in enumerate(ids)}
+        if len(pos) < len(ids):
+            counts = {}
+            for a in ids:
+                counts[a] = counts.get(a, 0) + 1
+            dup = [str(a) for a, c in counts.items() if c > 1]
+            raise ValueError(f"{len(dup)} duplicate activity ID(s): " + ", ".join(dup[:20]) + (" ..." if len(dup) > 20 else ""))
+        p = np.array([pos.get(a, -1) for a in pred_ids], dtype=np.int64)
+        s = np.array([pos.get(a, -1) for a in succ_ids], dtype=np.int64)
+        keep = (p >= 0) & (s >= 0) & (p != s)
+        rel = None if rel is None else [r for r, k in zip(rel, keep) if k]
+        lag = None if lag is None else np.asarray(lag, dtype=float)[keep]
+        return cls(len(ids), p[keep], s[keep], rel, lag), int((~keep).sum())
+
+    def _csr(self, node, other):
+        """(ptr, edge order, other end) with edges sorted by node; node v owns edges ptr[v]:ptr[v+1]."""
+        order = np.argsort(node, kind="stable")
+        ptr = np.concatenate(([0], np.cumsum(np.bincount(node, minlength=self.n))))
+        return ptr, order, other[order]
+
+    def _grouped(self, node, other):
+        """
+        Edges sorted by (level of node, node). Per level: the edge slice, the distinct
+        nodes and their segment starts within the slice (for ufunc.reduceat).
+        """
+        order = np.lexsort((node, self.level[node]))
+        node_s = node[order]
+        bounds = np.searchsorted(self.level[node_s], np.arange(self.n_levels + 1))
+        first = np.ones(len(node_s), bool)
+        first[1:] = node_s[1:] != node_s[:-1]
+        levels = []
+        for l in range(self.n_levels):
+            a, b = bounds[l], bounds[l + 1]
+            if a < b:
+                starts = np.flatnonzero(first[a:b])
+                levels.append((a, b, node_s[a:b][starts], starts))
+        return order, node_s, other[order], levels
+
+    def _by_level(self, k):
+        """Level passes cost a few array calls per level; one schedule on a deep network goes edge by edge."""
+        return k > 1 or self.n_levels * LEVEL_COST_EDGES < len(self.pred)
+
+    # ---- passes ----
+    def forward(self, dur):
+        """Early starts for durations (n,) or (k, n)."""
+        D = np.atleast_2d(np.asarray(dur, dtype=float))
+        k, n = D.shape
+        if not self._by_level(k):
+            return self._forward_edges(D[0])
+        if self._fwd is None:
+            self._fwd = self._grouped(self.succ, self.pred)
+        order, dst, src, levels = self._fwd
+        lag = self.lag[order][:, None]
+        gidx = src + n * self._from_finish[order]      # into [ES; EF]
+        tf = self._to_finish[order]
+        DT = np.ascontiguousarray(D.T)                 # node-major: each gather copies whole rows
+        SE = np.zeros((2 * n, k))
+        SE[n:] = DT
+        for a, b, nodes, starts in levels:
+            cand = SE[gidx[a:b]]
+            cand += lag[a:b]
+            if self._has_to_finish:
+                into_finish = np.flatnonzero(tf[a:b])
+                cand[into_finish] -= DT[dst[a:b][into_finish]]
+            es = np.maximum.reduceat(cand, starts, axis=0)
+            np.maximum(es, 0.0, out=es)
+            SE[nodes] = es
+            SE[n + nodes] = es + DT[nodes]
+        es = SE[:n].T
+        return es if np.ndim(dur) == 2 else es[0]
+
+    def backward(self, dur, finish):
+        """Late starts for durations (n,) or (k, n) and project finish (scalar or (k,))."""
+        D = np.atleast_2d(np.asarray(dur, dtype=float))
+        k, n = D.shape
+        T = np.broadcast_to(np.asarray(finish, dtype=float).reshape(-1), (k,))
+        if not self._by_level(k):
+            return self._backward_edges(D[0], float(T[0]))
+        if self._bwd is None:
+            self._bwd = self._grouped(self.pred, self.succ)
+        order, src, dst, levels = self._bwd
+        lag = self.lag[order][:, None]
+        gidx = dst + n * self._to_finish[order]        # into [LS; LF]
+        ff = self._from_finish[order]
+        DT = np.ascontiguousarray(D.T)
+        LL = np.empty((2 * n, k))
+        LL[:n] = T - DT
+        LL[n:] = T
+        for a, b, nodes, starts in reversed(levels):
+            cand = LL[gidx[a:b]]
+            cand -= lag[a:b]
+            from_finish = np.flatnonzero(ff[a:b])
+            cand[from_finish] -= DT[src[a:b][from_finish]]
+            ls = np.minimum(LL[nodes], np.minimum.reduceat(cand, starts, axis=0))
+            LL[nodes] = ls
+            LL[n + nodes] = ls + DT[nodes]
+        ls = LL[:n].T
+        return ls if np.ndim(dur) == 2 else ls[0]
+
+    def _forward_edges(self, d):
+        n = self.n
+        ptr, order, src = self._in
+        g = (src + n * self._from_finish[order]).tolist()
+        w = (self.lag[order] - d[self.succ[order]] * self._to_finish[order]).tolist()
+        ptr, dl = ptr.tolist(), d.tolist()
+        X = [0.0] * (2 * n)                          # [ES | EF]
+        for v in self.topo:
+            best = 0.0
+            for e in range(ptr[v], ptr[v + 1]):
+                c = X[g[e]] + w[e]
+                if c > best:
+                    best = c
+            X[v] = best
+            X[n + v] = best + dl[v]
+        return np.array(X[:n])
+
+    def _backward_edges(self, d, finish):
+        n = self.n
+        ptr, order, dst = self._out
+        g = (dst + n * self._to_finish[order]).tolist()
+        w = (-self.lag[order] - d[self.pred[order]] * self._from_finish[order]).tolist()
+        ptr, dl = ptr.tolist(), d.tolist()
+        X = [finish - x for x in dl] + [finish] * n   # [LS | LF]
+        for u in reversed(self.topo):
+            best = X[u]
+            for e in range(ptr[u], ptr[u + 1]):
+                c = X[g[e]] + w[e]
+                if c < best:
+                    best = c
+            X[u] = best
+            X[n + u] = best + dl[u]
+        return np.array(X[:n])
+
+    def schedule(self, dur):
+        """Full CPM: early/late starts and finishes, total float and project finish."""
+        dur = np.asarray(dur, dtype=float)
+        es = self.forward(dur)
+        ef = es + dur
+        finish = ef.max(axis=-1) if self.n else np.zeros(dur.shape[:-1])
+        ls = self.backward(dur, finish)
+        return Schedule(es, ef, ls, ls + dur, ls - es, finish)
+
+    def critical(self, sched, tol=FLOAT_TOL):
+        """Mask of activities with (near) zero total float."""
+        return sched.total_float <= tol
+
+
+# -----------------------------
+# Benchmark
+# -----------------------------
+def _reference(n, pred, succ, rel, lag, dur):
+    """Early and late starts by repeated relaxation of every edge (no ordering used)."""
+    ff, tf = np.isin(rel, (0, 2)), np.isin(rel, (2, 3))
+    w = lag + dur[pred] * ff - dur[succ] * tf
+    es = np.zeros(n)
+    while True:
+        new = es.copy()
+        np.maximum.at(new, succ, es[pred] + w)
+        if np.array_equal(new, es):
+            break
+        es = new
+    finish = (es + dur).max()
+    ls = finish - dur
+    while True:
+        new = ls.copy()
+        np.minimum.at(new, pred, ls[succ] - w)
+        if np.array_equal(new, ls):
+            break
+        ls = new
+    return es, ls
+
+def _random_network(n, seed=0, floors=50):
+    """Floor-by-floor style network: a chain per floor, links to the floor above, some SS/FF/SF."""
+    rng = np.random.default_rng(seed)
+    per = max(1, n // floors)
+    v = np.arange(n)
+    pred, succ = [], []
+    pred.append(v[:-1][(v[1:] % per) != 0]); succ.append(v[1:][(v[1:] % per) != 0])
+    up = v[v + per < n]
+    pred.append(up); succ.append(up + per)
+    extra = rng.integers(0, n, size=n // 2)
+    tgt = np.minimum(n - 1, extra + per + rng.integers(-2, 3, size=len(extra)))
+    pred.append(extra); succ.append(tgt)
+    pred, succ = np.concatenate(pred), np.concatenate(succ)
+    keep = pred != succ
+    pred, succ = pred[keep], succ[keep]
+    rel = rng.choice(4, size=len(pred), p=[0.85, 0.1, 0.04, 0.01]).astype(np.int8)
+    lag = rng.integers(0, 3, size=len(pred)).astype(float)
+    dur = rng.integers(1, 15, size=n).astype(float)
+    return pred, succ, rel, lag, dur
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    for floors in (1, 40, 400):                  # deep, mixed and wide networks
+        p, s, r, g, d = _random_network(1500, seed=floors, floors=floors)
+        small = CPMNetwork(1500, p, s, r, g)
+        es, ls = _reference(1500, p, s, r, g, d)
+        sch = small.schedule(d)
+        assert np.allclose(sch.es, es) and np.allclose(sch.ls, ls), "passes disagree with relaxation"
+        batch = small.schedule(np.stack([d, d * 2]))
+        assert np.allclose(batch.es[0], es) and np.allclose(batch.ls[0], ls), "batched passes disagree"
+
+    for floors in (1, 50):                       # one long chain; 50 floors
+        pred, succ, rel, lag, dur = _random_network(n, floors=floors)
+        t0 = time.perf_counter()
+        net = CPMNetwork(n, pred, succ, rel, lag)
+        t1 = time.perf_counter()
+        sch = net.schedule(dur)
+        t2 = time.perf_counter()
+        print(f"{n} activities, {len(pred)} relationships, {net.n_levels} levels")
+        print(f"  build:            {t1 - t0:.3f} s")
+        print(f"  forward+backward: {t2 - t1:.3f} s  (finish {sch.finish:.0f}, {int(net.critical(sch).sum())} critical)")
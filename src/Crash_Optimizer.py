@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+Time-cost trade-off (crashing) on a CPMNetwork, used by Crashing_Duration.
+
+Every step shortens the project at the lowest cost per day: on the critical
+subnetwork it picks the cheapest set of activities that every critical path
+passes through exactly once (a minimum s-t cut, capacities = cost slopes),
+shortens them as far as possible before another path becomes critical or an
+activity hits its crash limit (binary search on forward passes), and
+recomputes the schedule. Repeats until the target duration is met or no
+critical path can be shortened. The network (CSR arrays, topological order)
+is built once; only durations change between steps.
+
+The critical subnetwork is built on start/finish events, so SS/FF/SF links are
+handled: crashing an activity whose finish drives its start (FF/SF) would not
+help and is never chosen.
+
+Self-check against brute force on small networks, plus a 20k-activity benchmark:
+    python Crash_Optimizer.py
+"""
+import itertools
+import math
+import time
+from collections import deque
+
+import numpy as np
+
+from CPM_Engine import CPMNetwork, FLOAT_TOL
+
+
+# ===== Max flow / min cut (Dinic) =====
+def _min_cut(n_nodes, tails, heads, caps, s, t):
+    """Source side (bool mask) of a minimum s-t cut and its capacity."""
+    m = len(tails)
+    to = heads + tails                       # arc e and its residual twin e + m
+    cap = list(caps) + [0.0] * m
+    adj = [[] for _ in range(n_nodes)]
+    for e in range(m):
+        adj[tails[e]].append(e)
+        adj[heads[e]].append(e + m)
+
+    def twin(e):
+        return e + m if e < m else e - m
+
+    flow = 0.0
+    while True:
+        level = [-1] * n_nodes
+        level[s] = 0
+        queue = deque([s])
+        while queue:
+            u = queue.popleft()
+            for e in adj[u]:
+                v = to[e]
+                if cap[e] > 0 and level[v] < 0:
+                    level[v] = level[u] + 1
+                    queue.append(v)
+        if level[t] < 0:
+            break
+        it = [0] * n_nodes
+        path, u = [], s
+        while True:                          # blocking flow, iterative DFS
+            while u != t:
+                while it[u] < len(adj[u]):
+                    e = adj[u][it[u]]
+                    if cap[e] > 0 and level[to[e]] == level[u] + 1:
+                        break
+                    it[u] += 1
+                if it[u] == len(adj[u]):     # dead end: retreat
+                    level[u] = -1
+                    if not path:
+                        break
+                    u = to[twin(path.pop())]
+                    it[u] += 1
+                    continue
+                path.append(adj[u][it[u]])
+                u = to[path[-1]]
+            if u != t:
+                break
+            pushed = min(cap[e] for e in path)
+            for e in path:
+                cap[e] -= pushed
+                cap[twin(e)] += pushed
+            flow += pushed
+            # resume from the tail of the first saturated arc instead of from s
+            first = next(i for i, e in enumerate(path) if cap[e] <= 0)
+            del path[first:]
+            u = to[path[-1]] if path else s
+    side = np.array([lv >= 0 for lv in level])
+    return side, flow
+
+
+def _contract_chains(n_nodes, tails, heads, caps, keep):
+    """
+    Replaces every chain a -> b -> ... -> c whose inner nodes have exactly one arc in
+    and one out by a single arc a -> c carrying the chain's cheapest arc (the only one
+    a cut would use). Returns tails, heads, caps and the original arc behind each arc.
+    """
+    inner = (np.bincount(heads, minlength=n_nodes) == 1) & (np.bincount(tails, minlength=n_nodes) == 1)
+    inner[keep] = False
+    out_arc = np.full(n_nodes, -1)
+    out_arc[tails] = np.arange(len(tails))
+    inner, out_arc = inner.tolist(), out_arc.tolist()
+    tails, heads, caps = tails.tolist(), heads.tolist(), caps.tolist()
+
+    new_t, new_h, new_c, rep = [], [], [], []
+    for e in range(len(tails)):
+        if inner[tails[e]]:
+            continue
+        best, v = e, heads[e]
+        while inner[v]:
+            f = out_arc[v]
+            if caps[f] < caps[best]:
+                best = f
+            v = heads[f]
+        new_t.append(tails[e])
+        new_h.append(v)
+        new_c.append(caps[best])
+        rep.append(best)
+    return new_t, new_h, new_c, np.array(rep, dtype=np.int64)
+
+
+# ===== Crashing =====
+def _event_arcs(net, dur):
+    """
+    Event graph: node v = start of activity v, n + v = its finish, 2n source, 2n + 1 sink.
+    Returns tails, heads, weights and the activity whose duration an arc carries (-1 if none).
+    """
+    n = net.n
+    v = np.arange(n)
+    rel = net.rel
+    tails = [v, n + v, net.pred + n * np.isin(rel, (0, 2)), np.full(n, 2 * n), n + v]
+    heads = [n + v, v, net.succ + n * np.isin(rel, (2, 3)), v, np.full(n, 2 * n + 1)]
+    weights = [dur, -dur, net.lag, np.zeros(n), np.zeros(n)]
+    owner = [v, np.full(n, -1), np.full(len(rel), -1), np.full(n, -1), np.full(n, -1)]
+    return (np.concatenate(tails), np.concatenate(heads),
+            np.concatenate(weights), np.concatenate(owner))
+
+def _critical_cut(net, dur, sched, slope, room, tol):
+    """Activities to shorten (cheapest cut of the critical subnetwork), or None if every cut is infinite."""
+    n = net.n
+    tails, heads, w, owner = _event_arcs(net, dur)
+    early = np.concatenate([sched.es, sched.ef, [0.0, sched.finish]])
+    late = np.concatenate([sched.ls, sched.lf, [0.0, sched.finish]])
+    crit = late - early <= tol
+    on = crit[tails] & crit[heads] & (early[tails] + w >= early[heads] - tol)
+    # finish -> start (weight -d) always holds with equality; it only drives the start
+    # when the finish itself is driven by a critical FF/SF link
+    rel_arcs = slice(2 * n, 2 * n + len(net.rel))
+    driven = np.zeros(2 * n + 2, bool)
+    driven[heads[rel_arcs][on[rel_arcs]]] = True
+    on[n:2 * n] &= driven[n:2 * n]
+    tails, heads, owner = tails[on], heads[on], owner[on]
+
+    # compact the critical events
+    nodes, idx = np.unique(np.concatenate([tails, heads, [2 * n, 2 * n + 1]]), return_inverse=True)
+    ti, hi = idx[:len(tails)], idx[len(tails):2 * len(tails)]
+    s, t = idx[-2], idx[-1]
+
+    crashable = (owner >= 0) & (room[np.maximum(owner, 0)] > tol)
+    finite = slope[owner[crashable]]
+    big = float(finite.sum()) + 1.0          # stands in for infinity
+    caps = np.full(len(ti), big)
+    caps[crashable] = finite
+    ct, ch, cc, rep = _contract_chains(len(nodes), ti, hi, caps, [s, t])
+    # reverse arcs with infinite capacity: no critical path may cross the cut twice
+    side, value = _min_cut(len(nodes), ct + ch, ch + ct, cc + [big] * len(ct), int(s), int(t))
+    if value >= big:
+        return None
+    cut = rep[side[ct] & ~side[ch]]
+    return np.unique(owner[cut[crashable[cut]]])
+
+def _finish(net, dur):
+    return float((net.forward(dur) + dur).max()) if net.n else 0.0
+
+def _longest_step(net, dur, cut, sched, room, target, whole_days, tol):
+    """
+    Largest amount to shorten the cut by while the project shortens just as much, i.e.
+    until a crash limit, the target, or a path that avoids the cut becomes critical.
+    finish(step) + step is convex and equals the current finish up to that point,
+    so a binary search over candidate steps finds it.
+    """
+    T = float(sched.finish)
+    if whole_days:
+        hi = min(math.floor(room[cut].min() + tol), math.ceil(T - target - tol))
+        if hi < 1:
+            return None
+        cands = np.arange(1.0, hi + 1)
+    else:
+        hi = min(float(room[cut].min()), T - target)
+        floats = sched.total_float[(sched.total_float > tol) & (sched.total_float < hi)]
+        cands = np.unique(np.append(floats, hi))
+    lo_i, hi_i = 0, len(cands) - 1
+    while lo_i < hi_i:
+        mid = (lo_i + hi_i + 1) // 2
+        trial = dur.copy()
+        trial[cut] -= cands[mid]
+        if _finish(net, trial) <= T - cands[mid] + tol:
+            lo_i = mid
+        else:
+            hi_i = mid - 1
+    return float(cands[lo_i])
+
+def crash_to_target(net, normal, crash, slope, target, whole_days=True, tol=FLOAT_TOL):
+    """
+    net: CPMNetwork; normal/crash: durations (crash <= normal); slope: cost per unit shortened.
+    Returns (durations, curve); curve rows are dicts Duration, Added Cost, Activities Shortened, Step Days.
+    """
+    normal = np.asarray(normal, dtype=float)
+    crash = np.minimum(np.asarray(crash, dtype=float), normal)
+    slope = np.asarray(slope, dtype=float)
+    dur = normal.copy()
+    sched = net.schedule(dur)
+    added = 0.0
+    curve = [{"Duration": float(sched.finish), "Added Cost": 0.0, "Activities Shortened": 0, "Step Days": 0.0}]
+
+    while sched.finish > target + tol:
+        room = dur - crash
+        cut = _critical_cut(net, dur, sched, slope, room, tol)
+        if cut is None or len(cut) == 0:
+            break
+        step = _longest_step(net, dur, cut, sched, room, target, whole_days, tol)
+        if step is None:
+            break
+        dur[cut] -= step
+        added += step * float(slope[cut].sum())
+        sched = net.schedule(dur)
+        curve.append({"Duration": float(sched.finish), "Added Cost": added,
+                      "Activities Shortened": int(len(cut)), "Step Days": float(step)})
+    return dur, curve
+
+
+# -----------------------------
+# Self-check
+# -----------------------------
+def _brute_force(net, normal, crash, slope):
+    """Cheapest added cost for every reachable project duration (small networks only)."""
+    best = {}
+    ranges = [range(int(c), int(d) + 1) for c, d in zip(crash, normal)]
+    for combo in itertools.product(*ranges):
+        d = np.array(combo, dtype=float)
+        fin = float(net.schedule(d).finish)
+        cost = float(((normal - d) * slope).sum())
+        best[fin] = min(best.get(fin, math.inf), cost)
+    return best
+
+if __name__ == "__main__":
+    from CPM_Engine import _random_network
+    rng = np.random.default_rng(0)
+    gaps = []
+    for trial in range(150):
+        n = int(rng.integers(3, 7))
+        pairs = [(a, b) for a in range(n) for b in range(a + 1, n) if rng.random() < 0.45]
+        pred = np.array([a for a, _ in pairs], dtype=np.int64)
+        succ = np.array([b for _, b in pairs], dtype=np.int64)
+        rel = rng.choice(4, size=len(pairs), p=[0.7, 0.15, 0.1, 0.05])
+        lag = rng.integers(0, 2, size=len(pairs)).astype(float)
+        net = CPMNetwork(n, pred, succ, rel, lag)
+        normal = rng.integers(2, 6, size=n).astype(float)
+        crash = normal - rng.integers(0, 3, size=n)
+        slope = rng.integers(1, 10, size=n).astype(float)
+
+        best = _brute_force(net, normal, crash, slope)
+        target = min(best)
+        dur, curve = crash_to_target(net, normal, crash, slope, target)
+        assert (dur >= crash - 1e-9).all() and (dur <= normal + 1e-9).all(), "crash limits violated"
+        for point in curve:
+            fin = point["Duration"]
+            assert point["Added Cost"] >= best[fin] - 1e-9, "cheaper than brute force?"
+            gaps.append(point["Added Cost"] - best[fin])
+        assert float(net.schedule(dur).finish) == curve[-1]["Duration"]
+    gaps = np.array(gaps)
+    print(f"crash_to_target: {len(gaps)} curve points, {np.mean(gaps < 1e-9):.0%} at the brute-force optimum, "
+          f"mean extra cost {gaps.mean():.2f}")
+
+    n = 20000
+    pred, succ, rel, lag, normal = _random_network(n, floors=200)
+    net = CPMNetwork(n, pred, succ, rel, lag)
+    crash = np.ceil(normal * 0.7)
+    slope = rng.integers(50, 500, size=n).astype(float)
+    start = float(net.schedule(normal).finish)
+    t0 = time.perf_counter()
+    dur, curve = crash_to_target(net, normal, crash, slope, start - 60)
+    print(f"{n} activities: {start:.0f} -> {curve[-1]['Duration']:.0f} days in {len(curve) - 1} steps, "
+          f"{time.perf_counter() - t0:.2f} s")
@@ -1,130 +1,249 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-
-import pandas as pd
-import tkinter as tk
-from tkinter import filedialog, simpledialog, messagebox
-from pathlib import Path
-import math
-
-# ===== Adjust these to match your sheet headers =====
-COLS = {
-    "id":   "task_code",
-    "name": "task_name",
-    "dur":  "target_drtn_hr_cnt",   # original duration (working days)
-    "lp":   "driving_path_flag"     # Y = on Longest Path
-}
-
-CRASHED_COL = "Crashed Duration"
-ROUND_TO_DAYS = True   # set False if you want decimals
-
-def to_float(x, default=0.0):
-    try:
-        return float(x)
-    except Exception:
-        return default
-
-def main():
-    # 1) Pick file
-    tk.Tk().withdraw()
-    in_path = filedialog.askopenfilename(
-        title="Select Primavera Excel",
-        filetypes=[("Excel files", "*.xlsx *.xls")]
-    )
-    if not in_path:
-        return
-
-    df = pd.read_excel(in_path)
-
-    # 2) Validate required columns
-    for key in ["dur", "lp"]:
-        if COLS[key] not in df.columns:
-            messagebox.showerror("Error", f"Missing column: {COLS[key]}")
-            return
-
-    # 3) Longest Path mask (Y/YES/1/TRUE)
-    lp_mask = df[COLS["lp"]].astype(str).str.upper().isin(["Y","YES","1","TRUE"])
-
-    # 4) Compute current project duration as sum of LP durations
-    cur = float(df.loc[lp_mask, COLS["dur"]].apply(to_float).sum())
-
-    # If nothing on LP, stop
-    if cur <= 0:
-        messagebox.showerror("Error", "No Longest Path durations found (sum = 0).")
-        return
-
-    # 5) Ask for target
-    target = simpledialog.askfloat(
-        "Target Project Duration",
-        f"Current project duration (Longest Path) ≈ {cur:.1f} working days.\n\n"
-        f"Enter target project duration (days):",
-        minvalue=1.0,
-        initialvalue=max(1.0, round(cur * 0.8, 1))
-    )
-    if target is None:
-        return
-
-    # 6) Compute proportional factor
-    # New LP sum should equal 'target' → scale LP durations by ratio = target / current
-    ratio = target / cur
-    # Safety guard
-    ratio = max(0.0, ratio)
-
-    # 7) Build 'Crashed Duration' column (copy original first)
-    df[CRASHED_COL] = df[COLS["dur"]].apply(to_float)
-
-    # Scale only LP rows
-    scaled = df.loc[lp_mask, COLS["dur"]].apply(to_float) * ratio
-    if ROUND_TO_DAYS:
-        scaled = scaled.round()  # round to nearest day
-
-    df.loc[lp_mask, CRASHED_COL] = scaled
-
-    # 8) Put the new column right after the duration column
-    cols = list(df.columns)
-    if CRASHED_COL in cols:
-        cols.remove(CRASHED_COL)
-    insert_at = cols.index(COLS["dur"]) + 1
-    cols.insert(insert_at, CRASHED_COL)
-    df = df[cols]
-
-    # 9) Recompute achieved (LP sum after scaling)
-    achieved = float(df.loc[lp_mask, CRASHED_COL].apply(to_float).sum())
-
-    # 10) Save
-    save_path = filedialog.asksaveasfilename(
-        title="Save Crashed File",
-        defaultextension=".xlsx",
-        initialfile=Path(in_path).stem + "_lp_proportional_crashed.xlsx",
-        filetypes=[("Excel files", "*.xlsx")]
-    )
-    if not save_path:
-        return
-
-    with pd.ExcelWriter(save_path, engine="openpyxl") as w:
-        df.to_excel(w, index=False, sheet_name="Crashed")
-        summary = pd.DataFrame({
-            "Metric": [
-                "CurrentDuration(LongestPath)",
-                "TargetDuration",
-                "AchievedDuration(LongestPath)",
-                "ScalingRatio (Target/Current)"
-            ],
-            "Value": [
-                round(cur,2),
-                round(target,2),
-                round(achieved,2),
-                round(ratio,4)
-            ]
-        })
-        summary.to_excel(w, index=False, sheet_name="Summary")
-
-    messagebox.showinfo(
-        "Done",
-        f"Current ≈ {cur:.0f}d → Target {target:.0f}d\n"
-        f"Achieved ≈ {achieved:.0f}d\n\n"
-        f"Saved:\n{save_path}"
-    )
-
-if __name__ == "__main__":
-    main()
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pandas as pd
+import tkinter as tk
+from tkinter import filedialog, simpledialog, messagebox
+from pathlib import Path
+import math
+import numpy as np
+from CPM_Engine import CPMNetwork
+from Crash_Optimizer import crash_to_target
+from Schedule_IO import to_float, id_key, pick_col, load_relationships
+from Work_Calendar import load_calendars, dated
+
+# ===== Adjust these to match your sheet headers =====
+COLS = {
+    "id":   "task_code",
+    "name": "task_name",
+    "dur":  "target_drtn_hr_cnt",   # original duration (working days)
+    "lp":   "driving_path_flag"     # Y = on Longest Path
+}
+
+# Time-cost crashing (with relationships): first matching header wins, missing ones use the defaults below
+CRASH_COLS = {
+    "crash_dur":  ["Crash Duration"],
+    "cost":       ["Normal Cost", "Selling Price Cost", "Stage Cost", "Total Cost"],   # Pricing02 / Activity_List
+    "crash_cost": ["Crash Cost"],
+}
+CRASH_LIMIT = 0.7      # shortest duration as a share of the original when there is no Crash Duration column
+CRASH_PREMIUM = 0.25   # crash cost = cost * (1 + premium) when there is no Crash Cost column
+MISSING_COST_SLOPE = None   # cost per day for rows with no cost (e.g. unpriced items); None = median of the priced rows
+
+CRASHED_COL = "Crashed Duration"
+ROUND_TO_DAYS = True   # set False if you want decimals
+
+def crash_inputs(df, normal):
+    """
+    Crash durations and cost slopes (cost per day shortened) per row, a note on their source,
+    and the mask of rows whose cost or crash cost is missing (they get MISSING_COST_SLOPE).
+    """
+    pick = {k: next((c for c in cands if c in df.columns), None) for k, cands in CRASH_COLS.items()}
+    limit = normal * CRASH_LIMIT
+    if ROUND_TO_DAYS:
+        limit = np.ceil(limit)
+    if pick["crash_dur"]:
+        given = df[pick["crash_dur"]].apply(lambda x: to_float(x, np.nan)).to_numpy()
+        crash = np.minimum(np.where(np.isnan(given), limit, given), normal)
+    else:
+        crash = limit
+    if pick["cost"] is None:
+        return crash, np.ones(len(normal)), "no cost column: slope 1 per day (fewest crash days)", np.zeros(len(normal), bool)
+    cost = df[pick["cost"]].apply(lambda x: to_float(x, np.nan)).to_numpy()
+    crash_cost = (df[pick["crash_cost"]].apply(lambda x: to_float(x, np.nan)).to_numpy() if pick["crash_cost"]
+                  else cost * (1 + CRASH_PREMIUM))
+    missing = np.isnan(cost) | np.isnan(crash_cost)
+    room = normal - crash
+    slope = np.divide(np.maximum(crash_cost - cost, 0.0), room, out=np.zeros(len(room)), where=(room > 0) & ~missing)
+    if MISSING_COST_SLOPE is not None:
+        fill = float(MISSING_COST_SLOPE)
+    else:
+        priced = slope[~missing & (room > 0)]
+        fill = float(np.median(priced)) if len(priced) else 1.0
+    slope[missing] = fill
+    note = f"cost '{pick['cost']}', crash cost '{pick['crash_cost'] or f'+{CRASH_PREMIUM:.0%}'}'"
+    if missing.any():
+        note += f", {int(missing.sum())} row(s) without cost at {fill:.2f} per day"
+    return crash, slope, note, missing
+
+def build_network(df, rel_df):
+    """CPM network over the rows of df (by task code). Returns (network, dropped links)."""
+    return CPMNetwork.from_ids(df[COLS["id"]].map(id_key).tolist(),
+                               rel_df["pred"], rel_df["succ"], rel_df["rel"].tolist(), rel_df["lag"])
+
+def main():
+    # 1) Pick file
+    tk.Tk().withdraw()
+    in_path = filedialog.askopenfilename(
+        title="Select Primavera Excel",
+        filetypes=[("Excel files", "*.xlsx *.xls")]
+    )
+    if not in_path:
+        return
+
+    df = pd.read_excel(in_path)
+
+    # 2) Validate required columns
+    for key in ["dur", "lp"]:
+        if COLS[key] not in df.columns:
+            messagebox.showerror("Error", f"Missing column: {COLS[key]}")
+            return
+
+    # 3) Longest Path mask (Y/YES/1/TRUE)
+    lp_mask = df[COLS["lp"]].astype(str).str.upper().isin(["Y","YES","1","TRUE"])
+
+    # 3b) Optional relationships → real CPM instead of summing the LP durations
+    net = None
+    if COLS["id"] in df.columns and messagebox.askyesno(
+            "Relationships", "Use a relationships file (CPM duration and time-cost crashing)?"):
+        rel_path = filedialog.askopenfilename(
+            title="Select Relationships Excel",
+            filetypes=[("Excel files", "*.xlsx *.xls")]
+        )
+        if rel_path:
+            try:
+                net, dropped = build_network(df, load_relationships(rel_path))
+                if dropped:
+                    print(f"[CPM] {dropped} relationship(s) refer to unknown activities or are self-links and were ignored.")
+            except ValueError as e:
+                messagebox.showerror("Error", f"Cannot use relationships:\n{e}")
+                return
+
+    # 4) Compute current project duration (CPM finish, or sum of LP durations)
+    method = "CPM" if net is not None else "LongestPath"
+    base_dur = df[COLS["dur"]].apply(to_float).to_numpy()
+    if net is not None:
+        cur = float(net.schedule(base_dur).finish)
+    else:
+        cur = float(df.loc[lp_mask, COLS["dur"]].apply(to_float).sum())
+
+    # If nothing on LP, stop
+    if cur <= 0:
+        messagebox.showerror("Error", f"No project duration found ({method} = 0).")
+        return
+
+    # 5) Ask for target
+    target = simpledialog.askfloat(
+        "Target Project Duration",
+        f"Current project duration ({method}) ≈ {cur:.1f} working days.\n\n"
+        f"Enter target project duration (days):",
+        minvalue=1.0,
+        initialvalue=max(1.0, round(cur * 0.8, 1))
+    )
+    if target is None:
+        return
+
+    curve = None
+    if net is not None:
+        # 6) Time-cost trade-off: shorten the cheapest critical activities until the target is met
+        crash, slope, cost_note, no_cost = crash_inputs(df, base_dur)
+        if no_cost.any():
+            ids = df.loc[no_cost, COLS["id"]].astype(str).tolist()
+            messagebox.showwarning(
+                "Missing Costs",
+                f"{len(ids)} activity(ies) have no cost; they are crashed at "
+                f"{'the median cost slope' if MISSING_COST_SLOPE is None else f'{MISSING_COST_SLOPE} per day'}:\n"
+                + ", ".join(ids[:20]) + (" ..." if len(ids) > 20 else "")
+            )
+        crashed, curve = crash_to_target(net, base_dur, crash, slope, target, whole_days=ROUND_TO_DAYS)
+        print(f"[Crash] {cost_note}; {len(curve) - 1} step(s)")
+        if no_cost.any():
+            df["Cost Missing"] = np.where(no_cost, "Y", "")
+        df[CRASHED_COL] = crashed
+        df["Crash Cost Added"] = (base_dur - crashed) * slope
+        added_cost = curve[-1]["Added Cost"]
+    else:
+        # 6) Compute proportional factor
+        # New LP sum should equal 'target' → scale LP durations by ratio = target / current
+        ratio = target / cur
+        # Safety guard
+        ratio = max(0.0, ratio)
+
+        # 7) Build 'Crashed Duration' column (copy original first)
+        df[CRASHED_COL] = df[COLS["dur"]].apply(to_float)
+
+        # Scale only LP rows
+        scaled = df.loc[lp_mask, COLS["dur"]].apply(to_float) * ratio
+        if ROUND_TO_DAYS:
+            scaled = scaled.round()  # round to nearest day
+
+        df.loc[lp_mask, CRASHED_COL] = scaled
+
+    # 8) Put the new column right after the duration column
+    cols = list(df.columns)
+    if CRASHED_COL in cols:
+        cols.remove(CRASHED_COL)
+    insert_at = cols.index(COLS["dur"]) + 1
+    cols.insert(insert_at, CRASHED_COL)
+    df = df[cols]
+
+    # 9) Recompute achieved (CPM on the crashed durations, or LP sum after scaling)
+    if net is not None:
+        sched = net.schedule(df[CRASHED_COL].apply(to_float).to_numpy())
+        achieved = float(sched.finish)
+        at = cols.index(CRASHED_COL) + 1
+        df.insert(at, "Early Start", sched.es)
+        df.insert(at + 1, "Early Finish", sched.ef)
+        df.insert(at + 2, "Total Float", sched.total_float)
+        df.insert(at + 3, "Critical (CPM)", ["Y" if c else "N" for c in net.critical(sched)])
+        start_date = simpledialog.askstring("Project Start", "Project start date (YYYY-MM-DD), blank for working days only:")
+        if start_date and start_date.strip():
+            trade_col = pick_col(df, ["stage", "trade"])        # each trade on its own calendar
+            try:
+                calendars, trade_calendar = load_calendars(in_path)
+                es_date, ef_date = dated(start_date.strip(), sched.es, sched.ef, calendars, trade_calendar,
+                                         df[trade_col] if trade_col is not None else None)
+                df.insert(at + 4, "Early Start Date", es_date)
+                df.insert(at + 5, "Early Finish Date", ef_date)
+            except ValueError as e:
+                messagebox.showwarning("Project Start", f"Dates skipped:\n{e}")
+    else:
+        achieved = float(df.loc[lp_mask, CRASHED_COL].apply(to_float).sum())
+
+    # 10) Save
+    save_path = filedialog.asksaveasfilename(
+        title="Save Crashed File",
+        defaultextension=".xlsx",
+        initialfile=Path(in_path).stem + ("_time_cost_crashed.xlsx" if net is not None else "_lp_proportional_crashed.xlsx"),
+        filetypes=[("Excel files", "*.xlsx")]
+    )
+    if not save_path:
+        return
+
+    with pd.ExcelWriter(save_path, engine="openpyxl") as w:
+        df.to_excel(w, index=False, sheet_name="Crashed")
+        summary = pd.DataFrame({
+            "Metric": [
+                f"CurrentDuration({method})",
+                "TargetDuration",
+                f"AchievedDuration({method})",
+                "AddedCrashCost" if curve is not None else "ScalingRatio (Target/Current)"
+            ],
+            "Value": [
+                round(cur,2),
+                round(target,2),
+                round(achieved,2),
+                round(added_cost,2) if curve is not None else round(ratio,4)
+            ]
+        })
+        summary.to_excel(w, index=False, sheet_name="Summary")
+        if curve is not None:
+            pd.DataFrame(curve).to_excel(w, index=False, sheet_name="TimeCostCurve")
+
+    if achieved > target + 1e-6:
+        messagebox.showwarning(
+            "Target Not Reached",
+            f"Achieved ≈ {achieved:.1f}d, above the target {target:.1f}d: "
+            + ("every critical path is at its crash limit." if curve is not None
+               else "rounding the scaled durations kept the Longest Path longer.")
+        )
+
+    messagebox.showinfo(
+        "Done",
+        f"Current ≈ {cur:.0f}d → Target {target:.0f}d\n"
+        f"Achieved ≈ {achieved:.0f}d\n\n"
+        f"Saved:\n{save_path}"
+    )
+
+if __name__ == "__main__":
+    main()
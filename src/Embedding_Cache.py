@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent SBERT embedding cache shared by Pricing02, Activity_Duration and
+Generate_Relationships.
+
+Embeddings are stored per (model name, normalize flag) as one float32 memmap
+(vectors.f32) plus an index file (index.json) mapping a hash of the normalized
+text to its row. Repeated runs only encode strings that were never seen before.
+
+Maintenance:
+    python Embedding_Cache.py info
+    python Embedding_Cache.py clear [model name]
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import time
+import unicodedata
+
+import numpy as np
+
+# ===== Config =====
+CACHE_DIR = os.environ.get(
+    "BIM_NLP_CACHE", os.path.join(os.path.expanduser("~"), ".bim_nlp_cache", "embeddings")
+)
+MAX_CACHE_BYTES = 512 * 1024 * 1024   # per model store; oldest rows evicted above this
+EVICT_TO_RATIO = 0.8                  # after eviction keep this share of MAX_CACHE_BYTES
+
+
+# ===== Keys =====
+def normalize_key_text(text) -> str:
+    """Whitespace-insensitive form used for hashing (SBERT tokenizers ignore it too)."""
+    s = unicodedata.normalize("NFC", "" if text is None else str(text))
+    return re.sub(r"\s+", " ", s).strip()
+
+def text_key(text) -> str:
+    return hashlib.sha1(normalize_key_text(text).encode("utf-8")).hexdigest()
+
+def model_slug(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name)
+
+
+# ===== Store =====
+class EmbeddingCache:
+    def __init__(self, model_name, normalize=False, cache_dir=None, max_bytes=MAX_CACHE_BYTES):
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.dir = os.path.join(cache_dir or CACHE_DIR, model_slug(model_name),
+                                "norm" if normalize else "raw")
+        self.index_path = os.path.join(self.dir, "index.json")
+        self.vectors_path = os.path.join(self.dir, "vectors.f32")
+        self._load_index()
+
+    # ---- index ----
+    def _load_index(self):
+        self.dim, self.rows, self.keys = None, 0, {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                idx = json.load(f)
+            rows = int(idx["rows"])
+            dim = idx["dim"]
+            size = os.path.getsize(self.vectors_path)
+            if dim is None or size != rows * int(dim) * 4:
+                raise ValueError("index and vectors file disagree")
+            self.dim, self.rows, self.keys = int(dim), rows, idx["keys"]
+        except (OSError, ValueError, KeyError, TypeError):
+            # missing or damaged store -> start empty
+            self.dim, self.rows, self.keys = None, 0, {}
+
+    def _save_index(self):
+        os.makedirs(self.dir, exist_ok=True)
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "dim": self.dim, "rows": self.rows, "keys": self.keys}, f)
+        os.replace(tmp, self.index_path)
+
+    def _vectors(self):
+        return np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.rows, self.dim))
+
+    # ---- read / write ----
+    def lookup(self, keys):
+        """Rows for keys already stored: (found_mask, array[n_found, dim])."""
+        found = np.array([k in self.keys for k in keys], dtype=bool)
+        if not found.any():
+            return found, np.zeros((0, self.dim or 0), dtype=np.float32)
+        now = time.time()
+        rows = []
+        for k, hit in zip(keys, found):
+            if hit:
+                entry = self.keys[k]
+                entry[1] = now
+                rows.append(entry[0])
+        return found, np.array(self._vectors()[np.array(rows)])
+
+    def add(self, keys, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if len(keys) == 0:
+            return
+        if self.dim is not None and vectors.shape[1] != self.dim:
+            # model output changed shape -> old rows are useless
+            self.clear()
+        os.makedirs(self.dir, exist_ok=True)
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            open(self.vectors_path, "wb").close()
+        with open(self.vectors_path, "ab") as f:
+            f.write(vectors.tobytes())
+        now = time.time()
+        for i, k in enumerate(keys):
+            self.keys[k] = [self.rows + i, now]
+        self.rows += len(keys)
+        self._evict()
+        self._save_index()
+
+    def _evict(self):
+        """Drop least recently used rows once the store is larger than max_bytes."""
+        row_bytes = self.dim * 4
+        if self.rows * row_bytes <= self.max_bytes:
+            return
+        keep_n = max(1, int(self.max_bytes * EVICT_TO_RATIO) // row_bytes)
+        recent = sorted(self.keys.items(), key=lambda kv: -kv[1][1])[:keep_n]
+        old_rows = np.array([e[0] for _, e in recent], dtype=int)
+        kept = np.array(self._vectors()[old_rows]) if len(old_rows) else np.zeros((0, self.dim), np.float32)
+
+        tmp = self.vectors_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(kept.astype(np.float32).tobytes())
+        os.replace(tmp, self.vectors_path)
+        self.keys = {k: [i, e[1]] for i, (k, e) in enumerate(recent)}
+        self.rows = len(self.keys)
+
+    def clear(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+        self.dim, self.rows, self.keys = None, 0, {}
+
+    # ---- main entry ----
+    def encode(self, model, texts, normalize_embeddings=False, show_progress_bar=False):
+        """Embeddings for texts (float32 array), encoding only strings missing from the store."""
+        texts = [normalize_key_text(t) for t in texts]
+        keys = [text_key(t) for t in texts]
+        found, cached = self.lookup(keys)
+        miss_pos = np.flatnonzero(~found)
+
+        new_keys = list(dict.fromkeys(keys[p] for p in miss_pos))
+        print(f"Embedding cache: {len(new_keys)} new text(s) to encode, "
+              f"{len(set(keys)) - len(new_keys)} reused.")
+        if new_keys:
+            text_of = {keys[p]: texts[p] for p in miss_pos}
+            new_vecs = np.asarray(model.encode([text_of[k] for k in new_keys],
+                                               normalize_embeddings=normalize_embeddings,
+                                               show_progress_bar=show_progress_bar), dtype=np.float32)
+            dim = new_vecs.shape[1]
+        else:
+            dim = self.dim or 0
+
+        out = np.empty((len(keys), dim), dtype=np.float32)
+        if found.any():
+            out[found] = cached
+        if new_keys:
+            row_of = {k: i for i, k in enumerate(new_keys)}
+            out[miss_pos] = new_vecs[[row_of[keys[p]] for p in miss_pos]]
+            self.add(new_keys, new_vecs)
+        elif found.any():
+            self._save_index()   # persist last-used times for eviction
+        return out
+
+
+def encode_cached(model, model_name, texts, normalize_embeddings=False,
+                  convert_to_tensor=False, show_progress_bar=False):
+    """Drop-in for model.encode(list, ...) backed by the on-disk cache."""
+    cache = EmbeddingCache(model_name, normalize=normalize_embeddings)
+    vecs = cache.encode(model, list(texts), normalize_embeddings=normalize_embeddings,
+                        show_progress_bar=show_progress_bar)
+    if convert_to_tensor:
+        import torch
+        return torch.from_numpy(vecs)
+    return vecs
+
+def unique_inverse(values):
+    """(uniques in first-seen order, inverse index) so that uniques[inverse[i]] == values[i]."""
+    first = {}
+    inverse = np.fromiter((first.setdefault(v, len(first)) for v in values), dtype=np.int64)
+    return list(first), inverse
+
+def encode_unique(model, model_name, texts, normalize_embeddings=False,
+                  convert_to_tensor=False, show_progress_bar=False):
+    """
+    Encode each distinct text once.
+    Returns (unique_texts, unique_emb, inverse); unique_emb[inverse] scatters back to rows.
+    """
+    uniq, inverse = unique_inverse(list(texts))
+    emb = encode_cached(model, model_name, uniq, normalize_embeddings=normalize_embeddings,
+                        convert_to_tensor=convert_to_tensor, show_progress_bar=show_progress_bar)
+    return uniq, emb, inverse
+
+def invalidate(model_name=None, cache_dir=None):
+    """Remove the cache of one model (or every model when model_name is None)."""
+    root = cache_dir or CACHE_DIR
+    target = os.path.join(root, model_slug(model_name)) if model_name else root
+    shutil.rmtree(target, ignore_errors=True)
+    print(f"Cleared embedding cache: {target}")
+
+
+# -----------------------------
+# Run
+# -----------------------------
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "info"
+    if cmd == "clear":
+        invalidate(sys.argv[2] if len(sys.argv) > 2 else None)
+    elif cmd == "info":
+        if not os.path.isdir(CACHE_DIR):
+            print(f"No embedding cache at {CACHE_DIR}")
+        for dirpath, _, files in os.walk(CACHE_DIR):
+            if "index.json" in files:
+                size = os.path.getsize(os.path.join(dirpath, "vectors.f32"))
+                print(f"{os.path.relpath(dirpath, CACHE_DIR)}: {size / 1e6:.1f} MB")
+    else:
+        print(__doc__)
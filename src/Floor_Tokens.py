@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Floor tokens in activity names (GF, L3, B1, ROOF, ...) and their building order,
+shared by RULE BASED03 and Line_Of_Balance.
+"""
+import re
+
+import pandas as pd
+
+
+def normalize_floor_text(text: str) -> str:
+    return (text or '').replace('lvl', 'level').replace('flr', 'floor')
+
+FLOOR_PATTERNS = [
+    ('LEVEL_NUM',     r'\blevel\s*(\d+)\b'),
+    ('L_NUM',         r'\bl\s*(\d+)\b'),
+    ('FLOOR_NUM',     r'\bfloor\s*(\d+)\b'),
+    ('BASEMENT_WORD', r'\bbasement\s*(\d+)\b'),
+    ('BASEMENT_B',    r'\bb(\d+)\b'),
+    ('GF',            r'\b(?:gf|g\.?f\.?|ground\s*floor)\b'),
+    ('ROOF',          r'\broof\b'),
+    ('PODIUM',        r'\bpodium\b'),
+    ('MEZZ',          r'\bmezzanine\b'),
+    ('ORDINAL_FLOOR', r'\b(first|second|third|fourth|fifth|sixth|seventh|eighth|ninth|tenth)\s+floor\b')
+]
+ORDINAL_MAP = {
+    'first': 'L1', 'second': 'L2', 'third': 'L3', 'fourth': 'L4', 'fifth': 'L5',
+    'sixth': 'L6', 'seventh': 'L7', 'eighth': 'L8', 'ninth': 'L9', 'tenth': 'L10'
+}
+
+def extract_floor_token(text: str) -> str:
+    t = (text or '').lower()
+    t = normalize_floor_text(t)
+    for kind, pat in FLOOR_PATTERNS:
+        m = re.search(pat, t, flags=re.IGNORECASE)
+        if not m:
+            continue
+        if kind in ('LEVEL_NUM', 'L_NUM', 'FLOOR_NUM'):
+            return f"L{int(m.group(1))}"
+        if kind in ('BASEMENT_WORD', 'BASEMENT_B'):
+            return f"B{int(m.group(1))}"
+        if kind == 'GF':
+            return 'GF'
+        if kind == 'ROOF':
+            return 'ROOF'
+        if kind == 'PODIUM':
+            return 'PODIUM'
+        if kind == 'MEZZ':
+            return 'MEZZ'
+        if kind == 'ORDINAL_FLOOR':
+            return ORDINAL_MAP.get(m.group(1).lower(), '')
+    return ''
+
+def floor_sort_key(token: str):
+    if not token or not isinstance(token, str):
+        return (5, 0)
+    if token.startswith('B') and token[1:].isdigit():
+        return (0, -int(token[1:]))    # B3 < B2 < B1
+    if token == 'GF':
+        return (1, 0)                  # GF ~ 0
+    if token == 'MEZZ':
+        return (1, 0.5)
+    if token == 'PODIUM':
+        return (1, 0.75)
+    if token.startswith('L') and token[1:].isdigit():
+        return (1, int(token[1:]))     # L1, L2, ...
+    if token == 'ROOF':
+        return (2, 10**6)
+    return (5, 0)
+
+def floor_tokens(names):
+    """extract_floor_token over a column of names, computed once per distinct name ('-' read as a space)."""
+    codes, uniques = pd.factorize(pd.Series(names).astype(str).str.replace("-", " ", regex=False))
+    tokens = pd.Series([extract_floor_token(u) for u in uniques], dtype=object)
+    return tokens.to_numpy(object)[codes] if len(codes) else tokens.to_numpy(object)
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Directed acyclic graph with online cycle detection (Pearce-Kelly dynamic
+topological order), used by Generate_Relationships to accept or reject links.
+
+Every node keeps a position in a topological order. An edge u -> v that
+already agrees with the order is accepted in O(1); otherwise only the nodes
+whose position lies between v and u are searched and reordered, instead of
+walking the whole graph as a plain DFS check does. An edge is rejected
+exactly when v already reaches u (or u == v).
+
+Benchmark against the plain DFS check:
+    python Incremental_DAG.py [nodes] [edges]
+"""
+import random
+import sys
+import time
+from collections import defaultdict
+
+
+class IncrementalDAG:
+    def __init__(self):
+        self._succ = {}
+        self._pred = {}
+        self._ord = {}
+        self._next = 0
+
+    # ---- nodes ----
+    def add_node(self, n):
+        if n not in self._ord:
+            self._succ[n] = set()
+            self._pred[n] = set()
+            self._ord[n] = self._next
+            self._next += 1
+
+    def __contains__(self, n):
+        return n in self._ord
+
+    def __len__(self):
+        return len(self._ord)
+
+    def successors(self, n):
+        return self._succ.get(n, set())
+
+    def predecessors(self, n):
+        return self._pred.get(n, set())
+
+    def edges(self):
+        return [(u, v) for u, vs in self._succ.items() for v in vs]
+
+    def topological_order(self):
+        return sorted(self._ord, key=self._ord.__getitem__)
+
+    # ---- search inside the affected window [ord[v], ord[u]] ----
+    def _forward(self, v, ub, target):
+        """Nodes reachable from v with ord <= ub; None if target is among them."""
+        ord_, seen, stack = self._ord, {v}, [v]
+        while stack:
+            node = stack.pop()
+            for w in self._succ[node]:
+                if w == target:
+                    return None
+                if w not in seen and ord_[w] < ub:
+                    seen.add(w)
+                    stack.append(w)
+        return seen
+
+    def _backward(self, u, lb):
+        """Nodes reaching u with ord > lb."""
+        ord_, seen, stack = self._ord, {u}, [u]
+        while stack:
+            node = stack.pop()
+            for w in self._pred[node]:
+                if w not in seen and ord_[w] > lb:
+                    seen.add(w)
+                    stack.append(w)
+        return seen
+
+    # ---- edges ----
+    def would_create_cycle(self, u, v):
+        """True if adding u -> v would close a cycle (v already reaches u)."""
+        if u == v:
+            return True
+        if u not in self._ord or v not in self._ord:
+            return False
+        if self._ord[u] < self._ord[v]:
+            return False
+        return self._forward(v, self._ord[u], u) is None
+
+    def add_edge(self, u, v):
+        """Insert u -> v and keep the order valid. Returns False (graph unchanged) on a cycle."""
+        if u == v:
+            return False
+        self.add_node(u)
+        self.add_node(v)
+        if v in self._succ[u]:
+            return True
+
+        lb, ub = self._ord[v], self._ord[u]
+        if lb < ub:
+            fwd = self._forward(v, ub, u)
+            if fwd is None:
+                return False
+            bwd = self._backward(u, lb)
+            # nodes reaching u go first, nodes reached from v after, each keeping relative order
+            moved = sorted(bwd, key=self._ord.__getitem__) + sorted(fwd, key=self._ord.__getitem__)
+            slots = sorted(self._ord[n] for n in moved)
+            for n, slot in zip(moved, slots):
+                self._ord[n] = slot
+
+        self._succ[u].add(v)
+        self._pred[v].add(u)
+        return True
+
+
+# -----------------------------
+# Benchmark
+# -----------------------------
+def _dfs_would_create_cycle(adj, u, v):
+    """Plain full-DFS check (the previous Generate_Relationships logic)."""
+    stack, seen = [v], set()
+    while stack:
+        node = stack.pop()
+        if node == u:
+            return True
+        if node in seen:
+            continue
+        seen.add(node)
+        stack.extend(adj[node])
+    return False
+
+def benchmark(n_nodes=3000, n_edges=12000, seed=0):
+    rng = random.Random(seed)
+    # mostly "forward" links like floor-by-floor schedules, with some backward ones
+    edges = []
+    for _ in range(n_edges):
+        a = rng.randrange(n_nodes)
+        b = min(n_nodes - 1, a + rng.randint(1, 40)) if rng.random() < 0.9 else rng.randrange(n_nodes)
+        edges.append((a, b))
+
+    t0 = time.perf_counter()
+    adj, naive = defaultdict(set), []
+    for u, v in edges:
+        ok = not _dfs_would_create_cycle(adj, u, v)
+        if ok:
+            adj[u].add(v)
+        naive.append(ok)
+    t_naive = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    dag = IncrementalDAG()
+    fast = [dag.add_edge(u, v) for u, v in edges]
+    t_fast = time.perf_counter() - t0
+
+    assert fast == naive, "incremental and DFS checks disagree"
+    pos = {n: i for i, n in enumerate(dag.topological_order())}
+    assert all(pos[u] < pos[v] for u, v in dag.edges()), "order violates an edge"
+    print(f"{n_nodes} nodes, {n_edges} edges, {naive.count(False)} rejected (same in both)")
+    print(f"DFS check:   {t_naive:.3f} s")
+    print(f"Incremental: {t_fast:.3f} s")
+    return t_naive, t_fast
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    benchmark(*args)
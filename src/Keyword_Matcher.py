@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Aho-Corasick multi-pattern matcher used by Activity_ID to find floor, phase and
+building names inside activity names in one pass over each text.
+
+Patterns are given as several tables (lists). For every table the matcher
+returns the position of the first-listed pattern that occurs anywhere in the
+text, which is the same answer as testing `pattern in text` for each pattern
+in list order and stopping at the first hit. An empty pattern occurs in every
+text, as with `in`.
+"""
+from collections import deque
+
+NO_MATCH = None
+
+
+class KeywordMatcher:
+    def __init__(self, tables):
+        """tables: list of pattern lists; a pattern's priority is its position in its list."""
+        self.n_tables = len(tables)
+        inf = float("inf")
+        self._goto = [{}]
+        own = [[inf] * self.n_tables]
+        for t, patterns in enumerate(tables):
+            for prio, pat in enumerate(patterns):
+                s = 0
+                for ch in pat:
+                    nxt = self._goto[s].get(ch)
+                    if nxt is None:
+                        nxt = len(self._goto)
+                        self._goto[s][ch] = nxt
+                        self._goto.append({})
+                        own.append([inf] * self.n_tables)
+                    s = nxt
+                own[s][t] = min(own[s][t], prio)
+
+        # failure links (BFS); best[s] = first-listed pattern per table ending at s or any suffix state
+        self._fail = [0] * len(self._goto)
+        self._best = [None] * len(self._goto)
+        self._best[0] = tuple(own[0])
+        queue = deque()
+        for s in self._goto[0].values():
+            self._best[s] = tuple(map(min, own[s], self._best[0]))
+            queue.append(s)
+        while queue:
+            r = queue.popleft()
+            for ch, s in self._goto[r].items():
+                f = self._fail[r]
+                while ch not in self._goto[f] and f:
+                    f = self._fail[f]
+                self._fail[s] = self._goto[f].get(ch, 0)
+                self._best[s] = tuple(map(min, own[s], self._best[self._fail[s]]))
+                queue.append(s)
+        # states that can add a match beyond what the root (empty pattern) reports
+        self._hits = [b != self._best[0] for b in self._best]
+
+    def first_matches(self, text):
+        """Per table, the priority of the first-listed pattern found in text (NO_MATCH if none)."""
+        goto, fail, best, hits = self._goto, self._fail, self._best, self._hits
+        found = best[0]
+        s = 0
+        for ch in text:
+            while ch not in goto[s] and s:
+                s = fail[s]
+            s = goto[s].get(ch, 0)
+            if hits[s]:
+                found = tuple(map(min, found, best[s]))
+        return tuple(NO_MATCH if p == float("inf") else p for p in found)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Line-of-balance (flowline) schedule for repetitive floors.
+
+Every concrete stage (Shuttering, Steelfixing, Pouring, Deshuttering, in that
+order) is one crew group moving up the building floor by floor. Its work on a
+floor is the crew-days of that stage's activities on the floor (duration x
+crews, from Activity_Duration) divided by the group's crews. The stage then
+keeps a constant pace, its takt: the longest floor of the stage ("stage") or
+of all stages ("common"). Each stage starts as early as it can while staying
+at least BUFFER_DAYS behind the previous stages on every floor, so no crew has
+to stop halfway up the building.
+
+Output: one activity per (stage, floor) with its flowline start/finish, the
+relationships as one table in the ForPrimavera layout (SS + takt between floors
+of a stage, FS + buffer between stages on a floor), and the flowline table
+(start day per floor and stage). The links alone let CPM start the lower floors
+earlier; the flowline dates are the continuous-crew plan.
+
+    python Line_Of_Balance.py                        (pick files)
+    python Line_Of_Balance.py --benchmark [floors] [elements per floor]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+import tkinter as tk
+from tkinter import filedialog, simpledialog, messagebox
+from pathlib import Path
+from Floor_Tokens import floor_tokens, floor_sort_key
+from Schedule_IO import ACT_COLS, to_float, pick_col, load_pools, assign_trades, crew_demand
+from Work_Calendar import load_calendars, dated
+
+BUFFER_DAYS = 1        # minimum gap between consecutive stages on a floor
+TAKT_MODE = "stage"    # "stage": each stage its own pace; "common": one takt for all stages
+ID_PREFIX = "LOB"
+ID_START, ID_STEP = 1000, 10
+
+
+def flowline(stage, floor, crew_days, crews, n_floors, buffer=BUFFER_DAYS, takt_mode=TAKT_MODE):
+    """
+    stage/floor: index per activity; crew_days: work per activity; crews: crews per stage.
+    Returns (duration, start) as (stages x floors) day grids (duration 0 = no work) and the takt per stage.
+    """
+    n_stages = len(crews)
+    work = np.zeros((n_stages, n_floors))
+    np.add.at(work, (stage, floor), crew_days)
+    dur = np.ceil(work / np.maximum(np.asarray(crews, dtype=float), 1)[:, None] - 1e-9)
+    takt = dur.max(axis=1) if takt_mode == "stage" else np.full(n_stages, dur.max() if dur.size else 0.0)
+
+    start = np.zeros((n_stages, n_floors))
+    ready = np.full(n_floors, -np.inf)           # latest finish of the earlier stages, per floor
+    pace = np.arange(n_floors)
+    for s in range(n_stages):
+        on = dur[s] > 0
+        if not on.any():
+            continue
+        need = ready[on] + buffer - pace[on] * takt[s]
+        s0 = max(0.0, float(np.ceil(need.max() - 1e-9))) if np.isfinite(need).any() else 0.0
+        start[s] = s0 + pace * takt[s]
+        ready = np.where(on, np.maximum(ready, start[s] + dur[s]), ready)
+    return dur, start, takt
+
+def flowline_tables(dur, start, takt, stages, floors, buffer=BUFFER_DAYS):
+    """Activities and ForPrimavera relationships for the non-empty cells of the flowline, built as arrays."""
+    s_idx, f_idx = np.nonzero(dur > 0)                   # stage by stage, floors upwards
+    n = len(s_idx)
+    ids = np.char.add(ID_PREFIX, (ID_START + ID_STEP * np.arange(n)).astype(str)).astype(object)
+    names = np.char.add(np.char.add(np.asarray(stages, dtype=str)[s_idx], " - "),
+                        np.asarray(floors, dtype=str)[f_idx]).astype(object)
+    acts = pd.DataFrame({
+        "Activity ID": ids, "Activity Name": names,
+        "Stage": np.asarray(stages, dtype=object)[s_idx], "Floor": np.asarray(floors, dtype=object)[f_idx],
+        "Duration": dur[s_idx, f_idx], "Start Day": start[s_idx, f_idx],
+        "Finish Day": start[s_idx, f_idx] + dur[s_idx, f_idx],
+    })
+
+    # same stage, next floor with work: SS + takt x floors apart (the crew's pace)
+    up = np.flatnonzero(s_idx[1:] == s_idx[:-1])
+    up_lag = takt[s_idx[up]] * (f_idx[up + 1] - f_idx[up])
+    # same floor, next stage with work: FS + buffer
+    by_floor = np.lexsort((s_idx, f_idx))
+    nxt = np.flatnonzero(f_idx[by_floor][1:] == f_idx[by_floor][:-1])
+    pred = np.concatenate([up, by_floor[nxt]])
+    succ = np.concatenate([up + 1, by_floor[nxt + 1]])
+    rels = pd.DataFrame({
+        "Activity Predecessor ID": ids[pred], "Activity Predecessor Name": names[pred],
+        "Activity Successor ID": ids[succ], "Activity Successor Name": names[succ],
+        "Relation": np.repeat(["SS", "FS"], [len(up), len(nxt)]),
+        "Lag": np.concatenate([up_lag, np.full(len(nxt), float(buffer))]),
+    })
+    return acts, rels
+
+
+def main():
+    # 1) Pick file
+    tk.Tk().withdraw()
+    in_path = filedialog.askopenfilename(
+        title="Select Activity Durations Excel",
+        filetypes=[("Excel files", "*.xlsx *.xls")]
+    )
+    if not in_path:
+        return
+
+    df = pd.read_excel(in_path)
+    cols = {k: pick_col(df, v) for k, v in ACT_COLS.items()}
+    for key in ["dur", "name"]:
+        if cols[key] is None:
+            messagebox.showerror("Error", f"Missing column: {ACT_COLS[key][0]}")
+            return
+
+    # 2) Crews per stage and buffer
+    pools = load_pools(in_path)
+    for stage_name in list(pools):
+        crews = simpledialog.askinteger("Line of Balance", f"Crews moving up the floors for {stage_name}:",
+                                        initialvalue=pools[stage_name], minvalue=1)
+        if crews is None:
+            return
+        pools[stage_name] = crews
+    buffer = simpledialog.askfloat("Line of Balance", "Buffer between stages on a floor (days):",
+                                   initialvalue=BUFFER_DAYS, minvalue=0.0)
+    if buffer is None:
+        return
+    start_date = simpledialog.askstring("Project Start", "Project start date (YYYY-MM-DD), blank for days only:")
+
+    # 3) Place activities on (stage, floor)
+    stages = list(pools)
+    stage = assign_trades(df, cols, stages)
+    tokens = floor_tokens(df[cols["name"]])
+    floors = sorted({t for t, s in zip(tokens, stage) if t and s >= 0}, key=floor_sort_key)
+    floor = pd.Series(tokens).map({f: i for i, f in enumerate(floors)}).fillna(-1).astype(np.int64).to_numpy()
+    placed = (stage >= 0) & (floor >= 0)
+    if not placed.any():
+        messagebox.showerror("Error", "No activity has both a stage and a floor in its name.")
+        return
+    crew_days = df[cols["dur"]].apply(to_float).to_numpy() * crew_demand(df, cols)
+    print(f"[LOB] {int(placed.sum())} activities on {len(floors)} floors; {int((~placed).sum())} not placed.")
+
+    # 4) Flowline
+    dur, start, takt = flowline(stage[placed], floor[placed], crew_days[placed],
+                                list(pools.values()), len(floors), buffer)
+    acts, rels = flowline_tables(dur, start, takt, stages, floors, buffer)
+    if start_date and start_date.strip():
+        try:
+            calendars, trade_calendar = load_calendars(in_path)
+            acts["Start Date"], acts["Finish Date"] = dated(start_date.strip(), acts["Start Day"], acts["Finish Day"],
+                                                            calendars, trade_calendar, acts["Stage"])
+        except ValueError as e:
+            messagebox.showwarning("Project Start", f"Dates skipped:\n{e}")
+    total = float(acts["Finish Day"].max())
+    chart = pd.DataFrame(np.where(dur > 0, start, np.nan).T[::-1], columns=stages)
+    chart.insert(0, "Floor", floors[::-1])
+    summary = pd.DataFrame({
+        "Metric": ["Floors", "Activities placed", "Activities not placed", "Buffer (days)", "Takt mode",
+                   "Duration (days)"] + [f"Takt: {s}" for s in stages],
+        "Value": [len(floors), int(placed.sum()), int((~placed).sum()), buffer, TAKT_MODE,
+                  total] + takt.tolist(),
+    })
+
+    # 5) Save
+    save_path = filedialog.asksaveasfilename(
+        title="Save Line of Balance",
+        defaultextension=".xlsx",
+        initialfile=Path(in_path).stem + "_line_of_balance.xlsx",
+        filetypes=[("Excel files", "*.xlsx")]
+    )
+    if not save_path:
+        return
+    with pd.ExcelWriter(save_path, engine="openpyxl") as w:
+        acts.to_excel(w, index=False, sheet_name="Activities")
+        rels.to_excel(w, index=False, sheet_name="ForPrimavera")
+        chart.to_excel(w, index=False, sheet_name="Flowline")
+        summary.to_excel(w, index=False, sheet_name="Summary")
+
+    messagebox.showinfo(
+        "Done",
+        f"{len(acts)} flowline activities on {len(floors)} floors ≈ {total:.0f}d\n\nSaved:\n{save_path}"
+    )
+
+def benchmark(n_floors=200, per_floor=500):
+    from CPM_Engine import CPMNetwork
+    rng = np.random.default_rng(3)
+    crews = [4, 4, 2, 4]
+    n = n_floors * per_floor * len(crews)
+    stage = np.tile(np.repeat(np.arange(len(crews)), per_floor), n_floors)
+    floor = np.repeat(np.arange(n_floors), per_floor * len(crews))
+    crew_days = rng.integers(1, 4, size=n).astype(float)
+    floors = [f"L{i}" for i in range(n_floors)]
+    t0 = time.perf_counter()
+    dur, start, takt = flowline(stage, floor, crew_days, crews, n_floors)
+    acts, rels = flowline_tables(dur, start, takt, ["Shuttering", "Steelfixing", "Pouring", "Deshuttering"], floors)
+    secs = time.perf_counter() - t0
+    net, _ = CPMNetwork.from_ids(acts["Activity ID"].tolist(), rels["Activity Predecessor ID"],
+                                 rels["Activity Successor ID"], rels["Relation"].tolist(), rels["Lag"])
+    es = net.forward(acts["Duration"].to_numpy())
+    assert (acts["Start Day"].to_numpy() >= es - 1e-9).all(), "flowline breaks its own links"
+    print(f"{n} activities -> {len(acts)} flowline activities, {len(rels)} links in {secs:.2f} s; "
+          f"{acts['Finish Day'].max():.0f} days (CPM on the links {float((es + acts['Duration']).max()):.0f})")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--benchmark":
+        benchmark(*[int(a) for a in sys.argv[2:4]])
+    else:
+        main()
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Maximum-weight branching (Chu-Liu / Edmonds), used by the global linking
+mode of Generate_Relationships.
+
+A branching is a set of edges in which every node has at most one incoming
+edge and there is no directed cycle. Read with the edges reversed, this is a
+link set in which every activity has at most one successor link and the
+schedule stays acyclic, so the maximum-weight branching is the best
+constrained assignment of all candidate links at once.
+
+Weights should be integers (exact arithmetic through cycle contraction).
+Ties are broken by edge position (earlier wins), so the result depends only on
+the order in which the caller lists the edges.
+
+Self-check against brute force on small random graphs:
+    python Max_Branching.py
+"""
+import heapq
+import itertools
+import random
+
+
+class _RollbackUF:
+    """Union-find without path compression, so unions can be undone."""
+    def __init__(self, n):
+        self.e = [-1] * n
+        self.st = []
+
+    def find(self, x):
+        while self.e[x] >= 0:
+            x = self.e[x]
+        return x
+
+    def time(self):
+        return len(self.st)
+
+    def rollback(self, t):
+        while len(self.st) > t:
+            i, v = self.st.pop()
+            self.e[i] = v
+
+    def join(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return False
+        if self.e[a] > self.e[b]:
+            a, b = b, a
+        self.st.append((a, self.e[a]))
+        self.st.append((b, self.e[b]))
+        self.e[a] += self.e[b]
+        self.e[b] = a
+        return True
+
+
+def max_branching(n, edges):
+    """
+    n: number of nodes (0..n-1); edges: list of (u, v, w) for u -> v.
+    Returns the sorted positions of the chosen edges. Edges with w <= 0 are never chosen.
+
+    Solved as a minimum-cost arborescence (costs -w) from a virtual root that has a
+    zero-cost edge to every node; contraction follows Tarjan's O(E log^2 V) scheme with
+    lazily shifted heaps merged small-to-large and a rollback union-find to expand cycles.
+    """
+    root = n
+    valid = [i for i, (u, v, w) in enumerate(edges) if u != v and w > 0]
+    E = [(edges[i][0], edges[i][1], -edges[i][2]) for i in valid] + [(root, v, 0) for v in range(n)]
+
+    heaps = [[] for _ in range(n + 1)]
+    shift = [0] * (n + 1)           # true cost = stored cost + shift[component]
+    for k, (u, v, c) in enumerate(E):
+        heaps[v].append((c, k))
+    for h in heaps:
+        heapq.heapify(h)
+
+    uf = _RollbackUF(n + 1)
+    seen = [-1] * (n + 1)
+    seen[root] = root
+    incoming = [-1] * (n + 1)
+    cycles = []
+
+    for s in range(n + 1):
+        u, queue, path = s, [], []
+        while seen[u] < 0:
+            heap = heaps[u]
+            while True:                          # cheapest edge from outside u's component
+                c, k = heapq.heappop(heap)
+                if uf.find(E[k][0]) != u:
+                    break
+            shift[u] -= c + shift[u]             # reduce the other incoming edges by this cost
+            queue.append(k)
+            path.append(u)
+            seen[u] = s
+            u = uf.find(E[k][0])
+            if seen[u] == s:                     # cycle: contract it into one node
+                end, t = len(queue), uf.time()
+                merged, merged_shift = [], 0
+                while True:
+                    w = path.pop()
+                    h, h_shift = heaps[w], shift[w]
+                    if len(h) > len(merged):
+                        merged, h, merged_shift, h_shift = h, merged, h_shift, merged_shift
+                    for c, k in h:
+                        heapq.heappush(merged, (c + h_shift - merged_shift, k))
+                    if not uf.join(u, w):
+                        break
+                cycle_edges = queue[len(path):end]
+                del queue[len(path):]
+                u = uf.find(u)
+                heaps[u], shift[u], seen[u] = merged, merged_shift, -1
+                cycles.append((u, t, cycle_edges))
+        for k in queue:
+            incoming[uf.find(E[k][1])] = k
+
+    for u, t, cycle_edges in reversed(cycles):   # expand, most recent contraction first
+        uf.rollback(t)
+        in_edge = incoming[u]
+        for k in cycle_edges:
+            incoming[uf.find(E[k][1])] = k
+        incoming[uf.find(E[in_edge][1])] = in_edge
+
+    return sorted(valid[k] for k in incoming[:n] if k < len(valid))
+
+
+# -----------------------------
+# Self-check
+# -----------------------------
+def _is_branching(edges, subset):
+    heads = [edges[i][1] for i in subset]
+    if len(set(heads)) != len(heads) or any(edges[i][0] == edges[i][1] for i in subset):
+        return False
+    parent = {edges[i][1]: edges[i][0] for i in subset}
+    for s in parent:
+        seen, x = set(), s
+        while x in parent:
+            if x in seen:
+                return False
+            seen.add(x)
+            x = parent[x]
+    return True
+
+def _brute_force(n, edges):
+    best_w = 0
+    for r in range(1, n + 1):
+        for subset in itertools.combinations(range(len(edges)), r):
+            if _is_branching(edges, subset):
+                best_w = max(best_w, sum(edges[i][2] for i in subset))
+    return best_w
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    for trial in range(500):
+        n = rng.randint(2, 6)
+        edges = [(rng.randrange(n), rng.randrange(n), rng.randint(-2, 9)) for _ in range(rng.randint(1, 9))]
+        chosen = max_branching(n, edges)
+        assert _is_branching(edges, chosen), (n, edges, chosen)
+        got = sum(edges[i][2] for i in chosen)
+        want = _brute_force(n, edges)
+        assert got == want, (n, edges, chosen, got, want)
+    print("max_branching: 500 random graphs match brute force")
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Resource-constrained scheduling with crew pools per trade.
+
+Activity_Duration sizes every activity for a number of crews but nothing checks
+that those crews exist at the same time. This schedules the activities of a
+relationships network so that, on every day, the crews working in a trade
+(shuttering, steelfixing, pouring, deshuttering) never exceed its pool:
+
+  serial   - activities are taken in priority order once all their predecessors
+             are scheduled, each at the earliest day its relationships and the
+             remaining crews allow
+  parallel - the schedule moves day by day; on each decision day the eligible
+             activities start in priority order while crews are free
+
+Priority rules: LST (CPM late start), LFT, TF (total float), SPT (shortest first),
+ORDER (sheet order); ties go to the earlier row. The eligible activities are heaps,
+the crew usage per trade is an integer array over days. Times are whole days.
+
+Resource Delay is the days an activity waits for crews: its leveled start minus
+its CPM early start with the leveled durations. An activity that needs more
+crews than its pool runs longer instead (Crews Short, Leveled Duration), and
+that stretch is not counted as delay.
+
+    python Resource_Leveling.py                      (pick files)
+    python Resource_Leveling.py --benchmark [n]
+"""
+import sys
+import time
+import heapq
+import numpy as np
+import pandas as pd
+import tkinter as tk
+from tkinter import filedialog, simpledialog, messagebox
+from pathlib import Path
+from CPM_Engine import CPMNetwork
+from Schedule_IO import (ACT_COLS, to_float, id_key, pick_col, load_relationships,
+                         load_pools, assign_trades, crew_demand)
+from Work_Calendar import load_calendars, dated
+
+METHOD = "serial"      # "serial" or "parallel"
+PRIORITY = "LST"       # "LST", "LFT", "TF", "SPT" or "ORDER"
+PRIORITIES = ("LST", "LFT", "TF", "SPT", "ORDER")
+
+
+def fit_to_pools(dur, trade, demand, caps, trades=None):
+    """
+    Durations and crews that fit the pools: an activity needing more crews than its pool has
+    runs with the whole pool for proportionally longer (same crew-days).
+    Returns (dur, demand, stretched mask). Raises ValueError if activities with work belong to
+    a pool with no crews, since they could never be scheduled.
+    """
+    dur = np.maximum(np.ceil(np.asarray(dur, dtype=float) - 1e-9), 0).astype(np.int64)
+    trade = np.asarray(trade, dtype=np.int64)
+    caps = np.asarray(caps, dtype=np.int64)
+    demand = np.asarray(demand, dtype=np.int64)
+    pool = np.where(trade >= 0, caps[np.maximum(trade, 0)] if len(caps) else 0, 0)
+    empty = (trade >= 0) & (dur > 0) & (pool <= 0)
+    if empty.any():
+        counts = np.bincount(trade[empty], minlength=len(caps))
+        names = trades or [f"pool {i}" for i in range(len(caps))]
+        listed = ", ".join(f"{names[i]} ({c})" for i, c in enumerate(counts) if c)
+        raise ValueError(f"{int(empty.sum())} activity(ies) need crews from a pool with 0 crews: {listed}")
+    stretched = (trade >= 0) & (dur > 0) & (demand > pool)
+    safe = np.maximum(pool, 1)
+    dur = np.where(stretched, np.ceil(dur * demand / safe - 1e-9).astype(np.int64), dur)
+    demand = np.where(stretched, pool, demand)
+    return dur, demand, stretched
+
+def priority_values(net, dur, rule):
+    if rule == "ORDER":
+        return np.zeros(net.n)
+    if rule == "SPT":
+        return dur.astype(float)
+    sched = net.schedule(dur.astype(float))
+    return {"LST": sched.ls, "LFT": sched.lf, "TF": sched.total_float}[rule]
+
+
+# ===== Resource profile =====
+class CrewProfile:
+    """Crews in use per trade and day, as one integer array (trades x days) that grows on demand."""
+
+    def __init__(self, caps, horizon=1024):
+        self.caps = np.asarray(caps, dtype=np.int64)
+        self.usage = np.zeros((len(self.caps), horizon), dtype=np.int64)
+
+    def _reach(self, end):
+        if end > self.usage.shape[1]:
+            grown = np.zeros((len(self.caps), max(end, 2 * self.usage.shape[1])), dtype=np.int64)
+            grown[:, :self.usage.shape[1]] = self.usage
+            self.usage = grown
+
+    def fits(self, r, need, t, d):
+        self._reach(t + d)
+        return not (self.usage[r, t:t + d] > self.caps[r] - need).any()
+
+    def earliest(self, r, need, t, d):
+        """First day >= t on which need crews of trade r are free for d days."""
+        free = self.caps[r] - need
+        while True:
+            self._reach(t + d)
+            bad = np.flatnonzero(self.usage[r, t:t + d] > free)
+            if not len(bad):
+                return t
+            t += int(bad[-1]) + 1
+
+    def book(self, r, need, t, d):
+        self._reach(t + d)
+        self.usage[r, t:t + d] += need
+
+    def span(self, end):
+        self._reach(end)
+        return self.usage[:, :end]
+
+
+# ===== Schedule generation =====
+def level_schedule(net, dur, trade, demand, caps, priority=PRIORITY, method=METHOD):
+    """
+    net: CPMNetwork; dur: whole-day durations; trade: pool index per activity (-1 = unlimited);
+    demand: crews per activity; caps: crews per pool.
+    Returns (start, profile). Demand must fit the pools (see fit_to_pools), else ValueError.
+    """
+    n = net.n
+    dur = np.maximum(np.ceil(np.asarray(dur, dtype=float) - 1e-9), 0).astype(np.int64)
+    trade = np.asarray(trade, dtype=np.int64)
+    caps = np.asarray(caps, dtype=np.int64)
+    demand = np.asarray(demand, dtype=np.int64)
+    limited = (trade >= 0) & (dur > 0)
+    over = limited & (demand > np.where(trade >= 0, caps[np.maximum(trade, 0)] if len(caps) else 0, 0))
+    if over.any():
+        raise ValueError(f"{int(over.sum())} activity(ies) need more crews than their pool has (use fit_to_pools).")
+    prio = priority_values(net, dur, priority).tolist()
+    profile = CrewProfile(caps)
+
+    # successor lists with the constant part of each link: S[succ] >= S[pred] + w - (d[succ] if into finish)
+    ptr, order, succ = (a.tolist() for a in net._out)
+    w = (net.lag + dur[net.pred] * net._from_finish - dur[net.succ] * net._to_finish)[order].tolist()
+    d_list, lim = dur.tolist(), limited.tolist()
+    tr, dem = trade.tolist(), demand.tolist()
+    indeg = np.bincount(net.succ, minlength=n).tolist()
+    bound = [0.0] * n
+    start = [0] * n
+
+    def release(j):
+        """Successors of j whose predecessors are now all scheduled."""
+        ready = []
+        for e in range(ptr[j], ptr[j + 1]):
+            v = succ[e]
+            b = start[j] + w[e]
+            if b > bound[v]:
+                bound[v] = b
+            indeg[v] -= 1
+            if indeg[v] == 0:
+                ready.append(v)
+        return ready
+
+    def est(v):
+        return int(np.ceil(bound[v] - 1e-9))
+
+    if method == "serial":
+        heap = [(prio[v], v) for v in range(n) if indeg[v] == 0]
+        heapq.heapify(heap)
+        while heap:
+            _, j = heapq.heappop(heap)
+            t = est(j)
+            if lim[j]:
+                t = profile.earliest(tr[j], dem[j], t, d_list[j])
+                profile.book(tr[j], dem[j], t, d_list[j])
+            start[j] = t
+            for v in release(j):
+                heapq.heappush(heap, (prio[v], v))
+    elif method == "parallel":
+        waiting = [(0, prio[v], v) for v in range(n) if indeg[v] == 0]    # eligible, by earliest start
+        heapq.heapify(waiting)
+        available, finishing = [], []                                       # by priority / by finish day
+        t, done = 0, 0
+        while done < n:
+            while waiting and waiting[0][0] <= t:
+                _, p, v = heapq.heappop(waiting)
+                heapq.heappush(available, (p, v))
+            blocked = []
+            while available:
+                p, j = heapq.heappop(available)
+                if lim[j] and not profile.fits(tr[j], dem[j], t, d_list[j]):
+                    blocked.append((p, j))
+                    continue
+                if lim[j]:
+                    profile.book(tr[j], dem[j], t, d_list[j])
+                start[j] = t
+                done += 1
+                heapq.heappush(finishing, t + d_list[j])
+                for v in release(j):
+                    s = est(v)
+                    if s <= t:
+                        heapq.heappush(available, (prio[v], v))
+                    else:
+                        heapq.heappush(waiting, (s, prio[v], v))
+            for item in blocked:
+                heapq.heappush(available, item)
+            while finishing and finishing[0] <= t:
+                heapq.heappop(finishing)
+            nxt = [q[0][0] if q is waiting else q[0] for q in (waiting, finishing) if q]
+            if not nxt:
+                if done < n:
+                    raise RuntimeError("Resource leveling stalled: activities wait for crews that never free up.")
+                break
+            t = min(nxt)                       # next release or next crew freed
+    else:
+        raise ValueError(f"Unknown method: {method!r}")
+
+    start = np.asarray(start, dtype=np.int64)
+    end = int((start + dur).max()) if n else 0
+    return start, profile.span(end)
+
+def check_schedule(net, start, dur, trade, demand, caps):
+    """Violated links and the largest crew overrun (both 0 for a valid schedule)."""
+    dur = np.maximum(np.ceil(np.asarray(dur, dtype=float) - 1e-9), 0).astype(np.int64)
+    need = net.lag + dur[net.pred] * net._from_finish - dur[net.succ] * net._to_finish
+    late = start[net.succ] < start[net.pred] + need - 1e-9
+    use = np.zeros((len(caps), int((start + dur).max()) + 1 if len(start) else 1), dtype=np.int64)
+    for j in np.flatnonzero(trade >= 0):
+        use[trade[j], start[j]:start[j] + dur[j]] += demand[j]
+    return int(late.sum()), int(max(0, (use - np.asarray(caps)[:, None]).max())) if len(caps) else 0
+
+
+def main():
+    # 1) Pick files
+    tk.Tk().withdraw()
+    in_path = filedialog.askopenfilename(
+        title="Select Activity Durations Excel",
+        filetypes=[("Excel files", "*.xlsx *.xls")]
+    )
+    if not in_path:
+        return
+    rel_path = filedialog.askopenfilename(
+        title="Select Relationships Excel",
+        filetypes=[("Excel files", "*.xlsx *.xls")]
+    )
+    if not rel_path:
+        return
+
+    df = pd.read_excel(in_path)
+    cols = {k: pick_col(df, v) for k, v in ACT_COLS.items()}
+    for key in ["id", "dur"]:
+        if cols[key] is None:
+            messagebox.showerror("Error", f"Missing column: {ACT_COLS[key][0]}")
+            return
+
+    # 2) Network
+    try:
+        rel_df = load_relationships(rel_path)
+        net, dropped = CPMNetwork.from_ids(df[cols["id"]].map(id_key).tolist(),
+                                           rel_df["pred"], rel_df["succ"], rel_df["rel"].tolist(), rel_df["lag"])
+    except ValueError as e:
+        messagebox.showerror("Error", f"Cannot use relationships:\n{e}")
+        return
+    if dropped:
+        print(f"[CPM] {dropped} relationship(s) refer to unknown activities or are self-links and were ignored.")
+
+    # 3) Crew pools
+    pools = load_pools(in_path)
+    for trade_name in list(pools):
+        crews = simpledialog.askinteger("Crew Pools", f"Crews available for {trade_name}:",
+                                        initialvalue=pools[trade_name], minvalue=0)
+        if crews is None:
+            return
+        pools[trade_name] = crews
+    trades, caps = list(pools), np.array(list(pools.values()), dtype=np.int64)
+    start_date = simpledialog.askstring("Project Start", "Project start date (YYYY-MM-DD), blank for days only:")
+
+    # 4) Level
+    dur = np.maximum(np.ceil(df[cols["dur"]].apply(to_float).to_numpy() - 1e-9), 0).astype(np.int64)
+    trade = assign_trades(df, cols, trades)
+    try:
+        lev_dur, demand, stretched = fit_to_pools(dur, trade, crew_demand(df, cols), caps, trades)
+    except ValueError as e:
+        messagebox.showerror("Crew Pools", str(e))
+        return
+    if stretched.any():
+        print(f"[Crews] {int(stretched.sum())} activity(ies) need more crews than their pool; "
+              f"they run with the whole pool for longer (Crews Short = Y).")
+    cpm = net.schedule(dur.astype(float))
+    # Resource Delay is crew waiting only: measured from the CPM start with the stretched durations,
+    # so the pool stretch of Crews Short rows is not counted as a delay
+    cpm_fit = net.schedule(lev_dur.astype(float)) if stretched.any() else cpm
+    t0 = time.perf_counter()
+    start, usage = level_schedule(net, lev_dur, trade, demand, caps)
+    print(f"[Leveling] {METHOD}/{PRIORITY}: {net.n} activities in {time.perf_counter() - t0:.1f} s")
+    finish = start + lev_dur
+    makespan = int(finish.max()) if len(finish) else 0
+
+    # 5) Results
+    out = df.copy()
+    at = out.columns.get_loc(cols["dur"]) + 1
+    new = {
+        "Trade": np.where(trade >= 0, np.array(trades + [""], dtype=object)[trade], ""),
+        "Crews Used": np.where(trade >= 0, demand, 0),
+        "Crews Short": np.where(stretched, "Y", ""),
+        "Leveled Duration": lev_dur,
+        "Early Start": cpm.es,
+    }
+    if stretched.any():
+        new["Early Start (Leveled Duration)"] = cpm_fit.es
+    new.update({
+        "Leveled Start": start,
+        "Leveled Finish": finish,
+        "Resource Delay": start - np.ceil(cpm_fit.es - 1e-9).astype(np.int64),
+    })
+    if start_date and start_date.strip():
+        try:
+            calendars, trade_calendar = load_calendars(in_path)
+            new["Start Date"], new["Finish Date"] = dated(start_date.strip(), start, finish,
+                                                          calendars, trade_calendar, new["Trade"])
+        except ValueError as e:
+            messagebox.showwarning("Project Start", f"Dates skipped:\n{e}")
+    for k, (name, values) in enumerate(new.items()):
+        out.insert(at + k, name, values)
+
+    summary = pd.DataFrame({
+        "Metric": ["Duration (CPM, unlimited crews)", "Duration (CPM, leveled durations)", "Duration (leveled)",
+                   "Method", "Priority rule", "Activities waiting for crews", "Activities stretched (pool too small)"]
+                  + [f"Crews: {t}" for t in trades],
+        "Value": [round(float(cpm.finish), 2), round(float(cpm_fit.finish), 2), makespan, METHOD, PRIORITY,
+                  int((new["Resource Delay"] > 0).sum()), int(stretched.sum())] + caps.tolist(),
+    })
+    profile = pd.DataFrame(usage.T, columns=trades)
+    profile.insert(0, "Day", np.arange(len(profile)))
+
+    # 6) Save
+    save_path = filedialog.asksaveasfilename(
+        title="Save Leveled Schedule",
+        defaultextension=".xlsx",
+        initialfile=Path(in_path).stem + "_leveled.xlsx",
+        filetypes=[("Excel files", "*.xlsx")]
+    )
+    if not save_path:
+        return
+    with pd.ExcelWriter(save_path, engine="openpyxl") as w:
+        out.to_excel(w, index=False, sheet_name="Leveled")
+        summary.to_excel(w, index=False, sheet_name="Summary")
+        profile.to_excel(w, index=False, sheet_name="Crew Profile")
+
+    messagebox.showinfo(
+        "Done",
+        f"CPM ≈ {cpm.finish:.0f}d with unlimited crews\nLeveled ≈ {makespan}d\n\nSaved:\n{save_path}"
+    )
+
+def benchmark(n=20000):
+    from CPM_Engine import _random_network
+    rng = np.random.default_rng(1)
+    pred, succ, rel, lag, dur = _random_network(n, floors=200)
+    net = CPMNetwork(n, pred, succ, rel, lag)
+    trade = rng.integers(-1, 4, size=n)
+    caps = np.array([6, 6, 3, 6])
+    dur, demand, _ = fit_to_pools(dur, trade, rng.integers(1, 5, size=n), caps)
+    print(f"{n} activities, {len(pred)} relationships, CPM {net.schedule(dur).finish:.0f} days")
+    for method in ("serial", "parallel"):
+        for rule in PRIORITIES:
+            t0 = time.perf_counter()
+            start, _ = level_schedule(net, dur, trade, demand, caps, rule, method)
+            secs = time.perf_counter() - t0
+            bad_links, overrun = check_schedule(net, start, dur, trade, demand, caps)
+            assert bad_links == 0 and overrun == 0, (method, rule, bad_links, overrun)
+            print(f"  {method:8s} {rule:5s} {int((start + np.ceil(dur)).max()):6d} days  {secs:.2f} s")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--benchmark":
+        benchmark(*[int(a) for a in sys.argv[2:3]])
+    else:
+        main()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Sheet helpers shared by the scheduling tools (Crashing_Duration, Schedule_Risk,
+Resource_Leveling, Line_Of_Balance): reading numbers and activity IDs from
+Excel cells, finding columns by header, loading a relationships workbook, and
+the crew pools and per-activity trade / crew demand of the crew tools.
+"""
+import re
+import numpy as np
+import pandas as pd
+
+# Relationship files: ForPrimavera sheet of Generate_Relationships, RULE BASED output,
+# or a P6 TASKPRED export (first matching header wins)
+REL_SHEETS = ["ForPrimavera", "TASKPRED"]
+REL_COLS = {
+    "pred": ["Activity Predecessor ID", "Predecessor ID", "pred_task_id", "Predecessor"],
+    "succ": ["Activity Successor ID", "Successor ID", "task_id", "Successor"],
+    "rel":  ["Relation", "Rel Type", "pred_type", "Relationship Type"],
+    "lag":  ["Lag", "lag_hr_cnt"],
+}
+
+# ===== Crew pools (defaults; a "Crew Pools" sheet with Trade / Crews in the activities workbook overrides) =====
+CREW_POOLS = {"Shuttering": 4, "Steelfixing": 4, "Pouring": 2, "Deshuttering": 4}
+POOL_SHEET = "Crew Pools"
+
+# ===== Activity columns of the crew tools (first match wins, case-insensitive) =====
+ACT_COLS = {
+    "id":        ["activity id", "task_code"],
+    "dur":       ["activity duration (final)", "duration (days)", "target_drtn_hr_cnt", "duration"],
+    "trade":     ["stage", "trade"],                     # Activity_List stage column; else found in the name
+    "name":      ["activity name", "task_name"],
+    "crews":     ["number of crews"],
+    "suggested": ["suggested crews (to meet max)"],      # the final duration assumes these when it was capped
+}
+
+
+def to_float(x, default=0.0):
+    try:
+        return float(x)
+    except Exception:
+        return default
+
+def id_key(x):
+    """Activity IDs compared as text; 1010.0 read from one sheet matches 1010 from another."""
+    if isinstance(x, float) and x.is_integer():
+        x = int(x)
+    return str(x).strip()
+
+def pick_col(df, cands):
+    """First column of df whose header matches one of cands (lower case), or None."""
+    lower = {str(c).strip().lower(): c for c in df.columns}
+    return next((lower[c] for c in cands if c in lower), None)
+
+def load_relationships(path):
+    """Relationship table with columns pred, succ, rel, lag (raises ValueError if not found)."""
+    xl = pd.ExcelFile(path)
+    sheet = next((n for want in REL_SHEETS for n in xl.sheet_names if n.strip().lower() == want.lower()),
+                 xl.sheet_names[0])
+    rel_df = xl.parse(sheet_name=sheet)
+    rel_df.columns = rel_df.columns.astype(str).str.strip()
+    picked = {k: next((c for c in cands if c in rel_df.columns), None) for k, cands in REL_COLS.items()}
+    if picked["pred"] is None or picked["succ"] is None:
+        raise ValueError(f"Sheet '{sheet}' has no predecessor/successor ID columns.")
+    return pd.DataFrame({
+        "pred": rel_df[picked["pred"]].map(id_key),
+        "succ": rel_df[picked["succ"]].map(id_key),
+        "rel":  rel_df[picked["rel"]] if picked["rel"] else "FS",
+        "lag":  rel_df[picked["lag"]].apply(to_float) if picked["lag"] else 0.0,
+    })
+
+def load_pools(path):
+    """Crew pools: CREW_POOLS updated from the optional POOL_SHEET of the workbook."""
+    pools = dict(CREW_POOLS)
+    xl = pd.ExcelFile(path)
+    sheet = next((s for s in xl.sheet_names if s.strip().lower() == POOL_SHEET.lower()), None)
+    if sheet is None:
+        return pools
+    tab = xl.parse(sheet_name=sheet)
+    tab.columns = tab.columns.astype(str).str.strip().str.lower()
+    if {"trade", "crews"} <= set(tab.columns):
+        for trade, crews in zip(tab["trade"].astype(str).str.strip(), tab["crews"].apply(to_float)):
+            if trade and trade.lower() != "nan":
+                pools[trade] = max(int(crews), 0)
+    return pools
+
+def assign_trades(df, cols, trades):
+    """Pool index per row (-1 = not crew-limited): the trade/stage column, else a trade named in the activity name."""
+    out = np.full(len(df), -1, dtype=np.int64)
+    lower = [t.lower() for t in trades]
+    if cols["trade"]:
+        given = df[cols["trade"]].astype(str).str.strip().str.lower()
+        out = given.map({t: i for i, t in enumerate(lower)}).fillna(-1).astype(np.int64).to_numpy()
+    if cols["name"]:
+        # whole-name match; the trade is literal text (e.g. "Pouring (pump)"), not a pattern
+        names = df[cols["name"]].astype(str)
+        for i, t in enumerate(trades):
+            hit = (out < 0) & names.str.contains(rf"(?<!\w){re.escape(t)}(?!\w)", case=False, regex=True).to_numpy()
+            out[hit] = i
+    return out
+
+def crew_demand(df, cols):
+    """Crews per activity: suggested crews where the duration was capped, else the number of crews (default 1)."""
+    demand = (df[cols["crews"]].apply(lambda x: to_float(x, 1)).to_numpy() if cols["crews"]
+              else np.ones(len(df)))
+    if cols["suggested"]:
+        sug = df[cols["suggested"]].apply(lambda x: to_float(x, np.nan)).to_numpy()
+        demand = np.where(np.isnan(sug), demand, sug)
+    return np.maximum(np.ceil(demand), 1).astype(np.int64)
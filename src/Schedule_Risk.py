@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Monte Carlo schedule risk: samples every activity duration (PERT or triangular
+around the computed duration; weaker dictionary matches get wider ranges), runs
+the CPM forward/backward passes for a batch of iterations at once, and reports
+completion percentiles and each activity's criticality index (share of runs in
+which it is critical).
+
+    python Schedule_Risk.py                      (pick files)
+    python Schedule_Risk.py --benchmark [n] [iterations]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+import tkinter as tk
+from tkinter import filedialog, simpledialog, messagebox
+from pathlib import Path
+from CPM_Engine import CPMNetwork
+from Schedule_IO import to_float, id_key, pick_col, load_relationships
+from Work_Calendar import load_calendars
+
+# ===== Adjust these to match your sheet headers (first match wins, case-insensitive) =====
+ACT_COLS = {
+    "id":    ["activity id", "task_code"],
+    "name":  ["activity name", "task_name"],
+    "dur":   ["activity duration (final)", "duration (days)", "target_drtn_hr_cnt", "duration"],
+    "score": ["similarity score"],                          # Activity_Duration match score (0..1)
+    "low":   ["optimistic duration"],                       # optional explicit ranges
+    "high":  ["pessimistic duration"],
+}
+
+# Duration ranges around the computed duration d (when no explicit columns):
+#   low  = d * (1 - OPTIMISTIC  - SCORE_WIDEN * (1 - score) / 2)
+#   high = d * (1 + PESSIMISTIC + SCORE_WIDEN * (1 - score))
+# so weak dictionary matches get wider, more pessimistic ranges.
+OPTIMISTIC = 0.10
+PESSIMISTIC = 0.25
+SCORE_WIDEN = 0.50
+DEFAULT_SCORE = 0.5        # rows without a score
+
+DISTRIBUTION = "pert"      # "pert" or "triangular"
+ITERATIONS = 10000
+CHUNK = 1000               # iterations per batched pass (memory ~ 16 * n * CHUNK bytes)
+SEED = 42
+PERCENTILES = [5, 10, 20, 30, 40, 50, 60, 70, 80, 90, 95]
+
+
+def duration_ranges(df, cols):
+    """(low, mode, high) per activity and the rows without a duration (taken as 0, a milestone)."""
+    mode = df[cols["dur"]].apply(lambda x: to_float(x, np.nan)).to_numpy(dtype=float)
+    missing = np.isnan(mode)
+    mode = np.where(missing, 0.0, mode).clip(min=0)
+    score = (df[cols["score"]].apply(lambda x: to_float(x, DEFAULT_SCORE)).clip(0, 1).to_numpy()
+             if cols["score"] else np.full(len(df), DEFAULT_SCORE))
+    low = mode * (1 - OPTIMISTIC - SCORE_WIDEN * (1 - score) / 2)
+    high = mode * (1 + PESSIMISTIC + SCORE_WIDEN * (1 - score))
+    if cols["low"]:
+        given = df[cols["low"]].apply(lambda x: to_float(x, np.nan)).to_numpy()
+        low = np.where(np.isnan(given), low, given)
+    if cols["high"]:
+        given = df[cols["high"]].apply(lambda x: to_float(x, np.nan)).to_numpy()
+        high = np.where(np.isnan(given), high, given)
+    low = np.clip(low, 0, mode)
+    high = np.maximum(high, mode)
+    return low, mode, high, missing
+
+def sample_durations(rng, low, mode, high, k, dist=DISTRIBUTION):
+    """k samples per activity, shape (k, n)."""
+    width = high - low
+    safe = np.where(width > 0, width, 1.0)
+    if dist == "pert":
+        a = 1 + 4 * (mode - low) / safe
+        b = 1 + 4 * (high - mode) / safe
+        x = rng.beta(a, b, size=(k, len(mode)))
+    else:
+        c = (mode - low) / safe
+        u = rng.random((k, len(mode)))
+        x = np.where(u < c, np.sqrt(u * c), 1 - np.sqrt((1 - u) * (1 - c)))
+    return np.where(width > 0, low + x * width, mode)
+
+def simulate(net, low, mode, high, iterations=ITERATIONS, chunk=CHUNK, seed=SEED, dist=DISTRIBUTION):
+    """
+    Runs the iterations in batched CPM passes.
+    Returns (project finish per iteration, criticality index per activity).
+    """
+    rng = np.random.default_rng(seed)
+    finishes = np.empty(iterations)
+    critical = np.zeros(net.n)
+    for start in range(0, iterations, chunk):
+        k = min(chunk, iterations - start)
+        sched = net.schedule(sample_durations(rng, low, mode, high, k, dist))
+        finishes[start:start + k] = sched.finish
+        critical += net.critical(sched, tol=1e-6 * max(1.0, float(sched.finish.max()))).sum(axis=0)
+    return finishes, critical / iterations
+
+def completion_dates(start_date, days, calendar):
+    """Finish dates of project durations in working days (Work_Calendar, e.g. Ramadan short days)."""
+    return pd.to_datetime(calendar.finish_dates(start_date, days))
+
+def choose_calendar(calendars):
+    """Name of the calendar the completion dates use: the only one, else the one the user names (None = cancel)."""
+    names = list(calendars)
+    if len(names) == 1:
+        return names[0]
+    while True:
+        name = simpledialog.askstring("Project Calendar", "Calendar for the completion dates:\n" + "\n".join(names),
+                                      initialvalue=names[0])
+        if name is None:
+            return None
+        match = next((n for n in names if n.lower() == name.strip().lower()), None)
+        if match:
+            return match
+        messagebox.showwarning("Project Calendar", f"No calendar named '{name}'.")
+
+
+def main():
+    # 1) Pick files
+    tk.Tk().withdraw()
+    in_path = filedialog.askopenfilename(
+        title="Select Activity Durations Excel",
+        filetypes=[("Excel files", "*.xlsx *.xls")]
+    )
+    if not in_path:
+        return
+    rel_path = filedialog.askopenfilename(
+        title="Select Relationships Excel",
+        filetypes=[("Excel files", "*.xlsx *.xls")]
+    )
+    if not rel_path:
+        return
+
+    df = pd.read_excel(in_path)
+    cols = {k: pick_col(df, v) for k, v in ACT_COLS.items()}
+    for key in ["id", "dur"]:
+        if cols[key] is None:
+            messagebox.showerror("Error", f"Missing column: {ACT_COLS[key][0]}")
+            return
+
+    # 2) Network
+    try:
+        rel_df = load_relationships(rel_path)
+        net, dropped = CPMNetwork.from_ids(df[cols["id"]].map(id_key).tolist(),
+                                           rel_df["pred"], rel_df["succ"], rel_df["rel"].tolist(), rel_df["lag"])
+    except ValueError as e:
+        messagebox.showerror("Error", f"Cannot use relationships:\n{e}")
+        return
+    if dropped:
+        print(f"[CPM] {dropped} relationship(s) refer to unknown activities or are self-links and were ignored.")
+
+    # 3) Iterations and optional start date
+    iterations = simpledialog.askinteger("Monte Carlo", "Number of iterations:",
+                                         initialvalue=ITERATIONS, minvalue=100)
+    if iterations is None:
+        return
+    start_date = simpledialog.askstring("Project Start", "Project start date (YYYY-MM-DD), blank for days only:")
+    calendar = None
+    if start_date and start_date.strip():
+        try:
+            calendars = load_calendars(in_path)[0]
+            name = choose_calendar(calendars)
+            calendar = calendars[name] if name else None
+        except ValueError as e:
+            messagebox.showwarning("Project Start", f"Dates skipped:\n{e}")
+
+    # 4) Simulate
+    low, mode, high, no_dur = duration_ranges(df, cols)
+    if no_dur.any():
+        ids = df.loc[no_dur, cols["id"]].astype(str).tolist()
+        messagebox.showwarning(
+            "Missing Durations",
+            f"{len(ids)} activity(ies) have no duration; they are simulated as 0 days:\n"
+            + ", ".join(ids[:20]) + (" ..." if len(ids) > 20 else "")
+        )
+    deterministic = float(net.schedule(mode).finish)
+    t0 = time.perf_counter()
+    finishes, crit_index = simulate(net, low, mode, high, iterations)
+    print(f"[Risk] {iterations} iterations on {net.n} activities in {time.perf_counter() - t0:.1f} s")
+
+    # 5) Results
+    pct = pd.DataFrame({"Percentile": [f"P{p}" for p in PERCENTILES],
+                        "Duration (days)": np.percentile(finishes, PERCENTILES).round(2)})
+    if calendar is not None:
+        try:
+            pct["Completion Date"] = completion_dates(start_date.strip(), pct["Duration (days)"], calendar)
+        except ValueError as e:
+            messagebox.showwarning("Project Start", f"Dates skipped:\n{e}")
+            calendar = None
+    summary = pd.DataFrame({
+        "Metric": ["Deterministic (CPM)", "Mean", "Std Dev", "P(finish <= deterministic)",
+                   "Iterations", "Distribution", "Completion calendar"],
+        "Value": [round(deterministic, 2), round(float(finishes.mean()), 2), round(float(finishes.std()), 2),
+                  round(float((finishes <= deterministic + 1e-9).mean()), 4), iterations, DISTRIBUTION,
+                  calendar.name if calendar is not None else "(days only)"],
+    })
+    acts = pd.DataFrame({
+        "Activity ID": df[cols["id"]],
+        "Activity Name": df[cols["name"]] if cols["name"] else "",
+        "Optimistic": low.round(2), "Most Likely": mode, "Pessimistic": high.round(2),
+        "Criticality Index": crit_index.round(4),
+    })
+    if no_dur.any():
+        acts["Duration Missing"] = np.where(no_dur, "Y", "")
+    acts = acts.sort_values("Criticality Index", ascending=False, kind="stable")
+
+    # 6) Save
+    save_path = filedialog.asksaveasfilename(
+        title="Save Risk Analysis",
+        defaultextension=".xlsx",
+        initialfile=Path(in_path).stem + "_schedule_risk.xlsx",
+        filetypes=[("Excel files", "*.xlsx")]
+    )
+    if not save_path:
+        return
+    with pd.ExcelWriter(save_path, engine="openpyxl") as w:
+        summary.to_excel(w, index=False, sheet_name="Summary")
+        pct.to_excel(w, index=False, sheet_name="Percentiles")
+        acts.to_excel(w, index=False, sheet_name="Criticality")
+
+    p50, p80 = np.percentile(finishes, [50, 80])
+    messagebox.showinfo(
+        "Done",
+        f"Deterministic ≈ {deterministic:.0f}d\nP50 ≈ {p50:.0f}d, P80 ≈ {p80:.0f}d\n\nSaved:\n{save_path}"
+    )
+
+def benchmark(n=5000, iterations=ITERATIONS):
+    from CPM_Engine import _random_network
+    pred, succ, rel, lag, dur = _random_network(n, floors=20)
+    net = CPMNetwork(n, pred, succ, rel, lag)
+    low, high = dur * 0.8, dur * 1.4
+    t0 = time.perf_counter()
+    finishes, crit = simulate(net, low, dur, high, iterations)
+    p50, p80 = np.percentile(finishes, [50, 80])
+    print(f"{iterations} iterations, {n} activities, {len(pred)} relationships: {time.perf_counter() - t0:.1f} s")
+    print(f"deterministic {net.schedule(dur).finish:.0f}, P50 {p50:.0f}, P80 {p80:.0f}, "
+          f"{int((crit > 0.5).sum())} activities critical in most runs")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--benchmark":
+        benchmark(*[int(a) for a in sys.argv[2:4]])
+    else:
+        main()
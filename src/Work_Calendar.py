@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Working calendars: turns schedule times in working days (CPM, risk, leveling,
+flowline output) into dates.
+
+A calendar is a weekend, a list of holidays and Ramadan periods in which a
+working day only gives RAMADAN_CAPACITY of a normal day (shortened hours). Its
+days are laid out as a capacity array from the project start (1 = full day,
+0 = off, 0.75 = short day) with a running total, so converting a whole column
+of times is one np.searchsorted:
+
+    start at time s  -> first day whose running total passes s
+    finish at time e -> first day whose running total reaches e
+
+e.g. a 4-day activity from time 0 inside Ramadan finishes on its 6th working
+day (4 / 0.75 = 5.3).
+
+Calendars can be listed in a "Calendars" sheet of the activities workbook, one
+row per calendar: Calendar, Weekend ("Fri Sat"), Holidays (dates separated by
+commas), Ramadan Capacity, Trades (stages/trades that use it). Activities
+without a calendar of their own use the first one.
+
+Self-check:
+    python Work_Calendar.py
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+WEEKEND = "Fri"                 # six-day site week; "Fri Sat" for a five-day week
+HOLIDAYS = []                   # "YYYY-MM-DD" dates off on every calendar
+RAMADAN_CAPACITY = 0.75         # share of a normal day worked during Ramadan (6 of 8 hours)
+# Approximate (they move with the moon sighting); adjust to the announced dates.
+RAMADAN = [
+    ("2025-03-01", "2025-03-30"),
+    ("2026-02-18", "2026-03-19"),
+    ("2027-02-08", "2027-03-09"),
+    ("2028-01-28", "2028-02-26"),
+    ("2029-01-16", "2029-02-14"),
+    ("2030-01-05", "2030-02-03"),
+]
+CALENDAR_SHEET = "Calendars"
+TIME_TOL = 1e-9
+
+
+class WorkCalendar:
+    def __init__(self, name="Standard", weekend=WEEKEND, holidays=(), ramadan=RAMADAN,
+                 ramadan_capacity=RAMADAN_CAPACITY):
+        off = {d.capitalize()[:3] for d in str(weekend or "").replace(",", " ").split()}
+        unknown = off - set(WEEKDAYS)
+        if unknown:
+            raise ValueError(f"Calendar '{name}': unknown weekend day(s) {sorted(unknown)}")
+        if len(off) == len(WEEKDAYS):
+            raise ValueError(f"Calendar '{name}' has no working days.")
+        self.name = name
+        self.weekmask = [d not in off for d in WEEKDAYS]
+        self.holidays = np.array(sorted({*HOLIDAYS, *holidays}), dtype="datetime64[D]")
+        self.ramadan = [(np.datetime64(a, "D"), np.datetime64(b, "D")) for a, b in ramadan]
+        self.ramadan_capacity = float(ramadan_capacity)
+        self._cache = (None, None)       # (project start, running total of capacity)
+
+    def capacity(self, start, n_days):
+        """Work per calendar day for n_days from start (1 full day, 0 off)."""
+        days = np.datetime64(start, "D") + np.arange(n_days)
+        cap = np.is_busday(days, weekmask=self.weekmask, holidays=self.holidays).astype(float)
+        for a, b in self.ramadan:
+            cap[(days >= a) & (days <= b)] *= self.ramadan_capacity
+        return cap
+
+    def _running(self, start, upto):
+        """Running total of capacity from start, long enough to reach working time upto."""
+        start = np.datetime64(start, "D")
+        cached_start, total = self._cache
+        if cached_start != start or total[-1] < upto:
+            n = 512
+            while True:
+                total = np.cumsum(self.capacity(start, n))
+                if total[-1] >= upto + 1:
+                    break
+                n *= 2
+            self._cache = (start, total)
+        return total
+
+    def start_dates(self, start, times):
+        """Date each activity starts on, for start times in working days from the project start."""
+        t = np.maximum(np.asarray(times, dtype=float), 0)
+        total = self._running(start, float(t.max()) if t.size else 0.0)
+        return np.datetime64(start, "D") + np.searchsorted(total, t + TIME_TOL, side="left")
+
+    def finish_dates(self, start, times):
+        """Date each activity finishes on (end of that day), for finish times in working days."""
+        t = np.maximum(np.asarray(times, dtype=float), 0)
+        total = self._running(start, float(t.max()) if t.size else 0.0)
+        day = np.searchsorted(total, t - TIME_TOL, side="left")
+        # a zero time finishes where it starts (first working day)
+        first = np.searchsorted(total, TIME_TOL, side="left")
+        return np.datetime64(start, "D") + np.maximum(day, first)
+
+
+def default_calendars():
+    return {"Standard": WorkCalendar("Standard")}, {}
+
+def load_calendars(path):
+    """
+    ({name: WorkCalendar}, {trade (lower case): calendar name}) from the optional CALENDAR_SHEET
+    of the workbook; the built-in Standard calendar when there is none.
+    """
+    xl = pd.ExcelFile(path)
+    sheet = next((s for s in xl.sheet_names if s.strip().lower() == CALENDAR_SHEET.lower()), None)
+    if sheet is None:
+        return default_calendars()
+    tab = xl.parse(sheet_name=sheet, dtype=str).fillna("")
+    tab.columns = tab.columns.astype(str).str.strip().str.lower()
+    if "calendar" not in tab.columns:
+        raise ValueError(f"Sheet '{sheet}' has no Calendar column.")
+    calendars, trades = {}, {}
+    for _, row in tab.iterrows():
+        name = row["calendar"].strip()
+        if not name:
+            continue
+        holidays = [pd.Timestamp(h.strip()).date().isoformat()
+                    for h in row.get("holidays", "").replace(";", ",").split(",") if h.strip()]
+        share = row.get("ramadan capacity", "").strip()
+        calendars[name] = WorkCalendar(name, row.get("weekend", "") or WEEKEND, holidays,
+                                       ramadan_capacity=float(share) if share else RAMADAN_CAPACITY)
+        for trade in row.get("trades", "").replace(";", ",").split(","):
+            if trade.strip():
+                trades[trade.strip().lower()] = name
+    return (calendars, trades) if calendars else default_calendars()
+
+def dated(start, starts, finishes, calendars=None, trade_calendar=None, trades=None):
+    """
+    Start and finish dates (pandas datetimes) for whole columns of working-day times.
+    Each activity uses the calendar of its trade (trades: name per activity) or the first calendar.
+    """
+    if calendars is None:
+        calendars, trade_calendar = default_calendars()
+    starts = np.asarray(starts, dtype=float)
+    finishes = np.asarray(finishes, dtype=float)
+    names = list(calendars)
+    which = np.zeros(len(starts), dtype=np.int64)
+    if trades is not None and trade_calendar:
+        lookup = {t: names.index(c) for t, c in trade_calendar.items() if c in calendars}
+        which = pd.Series(trades).astype(str).str.strip().str.lower().map(lookup).fillna(0).astype(np.int64).to_numpy()
+    s_out = np.empty(len(starts), dtype="datetime64[D]")
+    f_out = np.empty(len(starts), dtype="datetime64[D]")
+    for k in np.unique(which):
+        rows = which == k
+        cal = calendars[names[k]]
+        s_out[rows] = cal.start_dates(start, starts[rows])
+        f_out[rows] = cal.finish_dates(start, finishes[rows])
+    return pd.to_datetime(s_out), pd.to_datetime(np.maximum(f_out, s_out))   # milestones: finish = start
+
+
+# -----------------------------
+# Self-check
+# -----------------------------
+if __name__ == "__main__":
+    cal = WorkCalendar("Check", weekend="Fri Sat", ramadan=[])
+    start = "2026-01-04"                                   # a Sunday
+    t = np.arange(0, 400)
+    ref = np.busday_offset(np.datetime64(start), t, roll="forward", weekmask=cal.weekmask)
+    assert (cal.start_dates(start, t) == ref).all(), "whole days must match np.busday_offset"
+    assert (cal.finish_dates(start, t + 1) == ref).all()
+
+    ram = WorkCalendar("Ramadan", weekend="Fri", ramadan=[("2026-02-18", "2026-03-19")])
+    s = ram.start_dates("2026-02-18", [0])[0]
+    f = ram.finish_dates("2026-02-18", [4])[0]
+    assert ram.capacity("2026-02-18", (f - s).astype(int) + 1).sum() >= 4 - 1e-9
+    assert ram.capacity("2026-02-18", (f - s).astype(int)).sum() < 4
+    print(f"4 working days from {s} in Ramadan finish on {f}")
+
+    n = 1_000_000
+    rng = np.random.default_rng(0)
+    es = rng.uniform(0, 3000, n).round()
+    ef = es + rng.integers(1, 30, n)
+    t0 = time.perf_counter()
+    sd, fd = dated("2026-01-03", es, ef)
+    print(f"{n} activities dated in {time.perf_counter() - t0:.2f} s ({sd.min().date()} .. {fd.max().date()})")